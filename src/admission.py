@@ -0,0 +1,161 @@
+# src/admission.py
+"""
+混雑時の受付制御（還元祭などで投稿が殺到したとき用）。
+- 仕事を段（lane）に分け、段ごとに「待ち行列の上限」「同時実行数」を持つ
+    extract : 束の処理（抽出・Keepa・返信）… 最優先
+    sheets  : Sheets 追記・報告人数の更新
+    chat    : メンション返信 … 最後。あふれたら「混んでるよ」と一言返して捨てる
+- 全体の同時実行数（≒ to_thread のスレッド数）を超えないよう、空きが出たら優先度の高い段から取り出す
+- 段の中はキー（ユーザー/チャンネル）ごとの小さな列を順番に回すので、1人の連投が全体を詰まらせない
+- 待ち行列・実行中の数・捨てた数は stats() で !health に出す
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+log = logging.getLogger(__name__)
+
+JobFactory = Callable[[], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class LaneConfig:
+    name: str
+    priority: int                      # 小さいほど優先
+    capacity: int                      # 段全体の待ち行列の上限
+    per_key: int                       # 1キー（ユーザー/チャンネル）あたりの待ち上限
+    concurrency: int                   # 段の同時実行数
+    max_wait: Optional[float] = None   # これより長く待った仕事は実行せずに捨てる
+
+
+@dataclass
+class _Job:
+    key: Hashable
+    factory: JobFactory
+    on_shed: Optional[JobFactory]
+    enq_at: float = field(default_factory=time.monotonic)
+
+
+class Lane:
+    def __init__(self, cfg: LaneConfig):
+        self.cfg = cfg
+        self._queues: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self.size = 0
+        self.running = 0
+        self.done = 0
+        self.shed = 0
+        self.space = asyncio.Event()
+
+    def has_room(self, key: Hashable) -> bool:
+        q = self._queues.get(key)
+        return self.size < self.cfg.capacity and (q is None or len(q) < self.cfg.per_key)
+
+    def offer(self, job: _Job) -> bool:
+        if not self.has_room(job.key):
+            return False
+        self._queues.setdefault(job.key, deque()).append(job)
+        self.size += 1
+        return True
+
+    def take(self) -> Optional[_Job]:
+        """先頭のキーから1件取り、そのキーを末尾へ回す（キー単位のラウンドロビン）"""
+        if not self._queues:
+            return None
+        key, q = next(iter(self._queues.items()))
+        job = q.popleft()
+        if q:
+            self._queues.move_to_end(key)
+        else:
+            del self._queues[key]
+        self.size -= 1
+        self.space.set()
+        return job
+
+
+class AdmissionController:
+    def __init__(self, lanes: List[LaneConfig], *, max_inflight: int = 5):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.lanes: Dict[str, Lane] = {c.name: Lane(c) for c in lanes}
+        self._order = sorted(self.lanes.values(), key=lambda l: l.cfg.priority)
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        # 既定は asyncio.to_thread の既定スレッド数と同じ（それ以上積んでもスレッド待ちの列が伸びるだけ）。
+        # extract は sheets の空きを待つことがあるので、extract 以外に最低1枠残す
+        inflight = max(2, int(os.getenv("NAGISA_ADMISSION_INFLIGHT", str(min(32, (os.cpu_count() or 1) + 4)))))
+        return cls(
+            [
+                LaneConfig("extract", 0, capacity=int(os.getenv("NAGISA_ADMISSION_BUNDLE_QUEUE", "50")),
+                           per_key=10, concurrency=max(1, inflight - 1),
+                           max_wait=float(os.getenv("NAGISA_ADMISSION_BUNDLE_WAIT_SEC", "30"))),
+                LaneConfig("sheets", 1, capacity=500, per_key=100, concurrency=max(1, inflight // 2)),
+                LaneConfig("chat", 2, capacity=int(os.getenv("NAGISA_ADMISSION_CHAT_QUEUE", "20")),
+                           per_key=3, concurrency=max(1, inflight // 4), max_wait=float(os.getenv("NAGISA_ADMISSION_CHAT_WAIT_SEC", "20"))),
+            ],
+            max_inflight=inflight,
+        )
+
+    def submit(self, stage: str, key: Hashable, factory: JobFactory, *, on_shed: Optional[JobFactory] = None) -> bool:
+        """待ち行列に積む。満杯なら積まずに False（捨てた扱い。on_shed は呼び出し側で）"""
+        lane = self.lanes[stage]
+        if not lane.offer(_Job(key, factory, on_shed)):
+            lane.shed += 1
+            log.warning(f"[admission] shed {stage} key={key} queued={lane.size}")
+            return False
+        self._pump()
+        return True
+
+    async def submit_wait(self, stage: str, key: Hashable, factory: JobFactory, *, timeout: float = 30.0) -> bool:
+        """空きが出るまで待ってから積む（上流を遅くする＝背圧）。待ちきれなければ False"""
+        lane = self.lanes[stage]
+        deadline = time.monotonic() + timeout
+        while not lane.has_room(key):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                lane.shed += 1
+                log.warning(f"[admission] shed {stage} key={key} after waiting {timeout:.0f}s")
+                return False
+            lane.space.clear()
+            try:
+                await asyncio.wait_for(lane.space.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        return self.submit(stage, key, factory)
+
+    def _pump(self):
+        while self.inflight < self.max_inflight:
+            lane = next((l for l in self._order if l.size and l.running < l.cfg.concurrency), None)
+            if lane is None:
+                return
+            job = lane.take()
+            if lane.cfg.max_wait is not None and time.monotonic() - job.enq_at > lane.cfg.max_wait:
+                lane.shed += 1
+                log.warning(f"[admission] shed {lane.cfg.name} key={job.key}: waited too long")
+                if job.on_shed is not None:
+                    asyncio.create_task(job.on_shed())
+                continue
+            lane.running += 1
+            self.inflight += 1
+            asyncio.create_task(self._run(lane, job))
+
+    async def _run(self, lane: Lane, job: _Job):
+        try:
+            await job.factory()
+        except Exception as e:
+            log.exception(f"[admission] {lane.cfg.name} job failed: {e}")
+        finally:
+            lane.running -= 1
+            lane.done += 1
+            self.inflight -= 1
+            self._pump()
+
+    def stats(self) -> dict:
+        return {
+            name: {"queued": l.size, "running": l.running, "done": l.done, "shed": l.shed}
+            for name, l in self.lanes.items()
+        }
@@ -0,0 +1,168 @@
+# src/barcode.py
+"""
+添付画像（棚札・商品のバーコード写真）から JAN（EAN-13）を読む。
+- 任意機能：NAGISA_BARCODE=1 かつ Pillow と pyzbar（＋OS の libzbar）が入っているときだけ動く
+    pip install pillow pyzbar   /   apt install libzbar0
+- デコードは CPU を食うので別プロセス（ProcessPoolExecutor）で。同時に投げる枚数も絞り、
+  ゲートウェイのイベントループは画像のダウンロード待ちしかしない
+- 結果は添付（attachment id）と画像の SHA-1 の2段でキャッシュ。
+  同じ添付（束の作り直し・編集）はダウンロードもしない。別の添付でも中身が同じ写真（貼り直し・転載）はデコードし直さない
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from importlib.util import find_spec
+from typing import List, Optional
+
+log = logging.getLogger(__name__)
+
+MAX_BYTES = 8 * 1024 * 1024
+MAX_SIDE = 1280
+
+
+def available() -> bool:
+    return find_spec("PIL") is not None and find_spec("pyzbar") is not None
+
+
+def enabled() -> bool:
+    return os.getenv("NAGISA_BARCODE") == "1" and available()
+
+
+def _valid_ean13(code: str) -> bool:
+    if len(code) != 13 or not code.isdigit():
+        return False
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(code[:12]))
+    return (10 - total % 10) % 10 == int(code[12])
+
+
+def decode_image_bytes(data: bytes, max_side: int = MAX_SIDE) -> List[str]:
+    """画像バイト列 → JAN のリスト（重複なし・見つかった順）。子プロセス側で呼ばれる"""
+    from PIL import Image
+    from pyzbar.pyzbar import ZBarSymbol, decode
+
+    img = Image.open(io.BytesIO(data))
+    img.draft("L", (max_side, max_side))  # JPEG は読み込み時点で縮小（速い）
+    img = img.convert("L")
+    passes = [max_side, max_side * 2] if max(img.size) > max_side else [max_side]
+    for side in passes:
+        work = img.copy()
+        work.thumbnail((side, side))
+        found = []
+        for r in decode(work, symbols=[ZBarSymbol.EAN13, ZBarSymbol.UPCA]):
+            code = r.data.decode("ascii", "ignore")
+            if len(code) == 12:  # UPC-A は先頭0で EAN-13 に
+                code = "0" + code
+            if _valid_ean13(code) and code not in found:
+                found.append(code)
+        if found:
+            return found
+    return []
+
+
+class BarcodeReader:
+    def __init__(self, *, procs: int = 1, max_pending: Optional[int] = None, cache_size: int = 512):
+        self.procs = procs
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._sem = asyncio.Semaphore(max_pending or procs * 2)
+        self._cache: "OrderedDict[str, List[str]]" = OrderedDict()          # 画像の SHA-1 → JAN
+        self._by_attachment: "OrderedDict[str, List[str]]" = OrderedDict()  # 添付のキー → JAN（ダウンロード前に引く）
+        self.cache_size = cache_size
+        self.hits = 0
+        self.attachment_hits = 0
+        self.decoded = 0
+        self.broken = False  # libzbar が無いなど、環境の問題で読めないと分かったら以降は何もしない
+
+    @classmethod
+    def from_env(cls) -> "BarcodeReader":
+        return cls(procs=int(os.getenv("NAGISA_BARCODE_PROCS", "1")))
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            import multiprocessing
+            # discord.py のスレッドを抱えたまま fork しないよう spawn で
+            self._pool = ProcessPoolExecutor(max_workers=self.procs, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def decode(self, data: bytes) -> List[str]:
+        return await self._decode(hashlib.sha1(data).hexdigest(), data)
+
+    async def _decode(self, h: str, data: bytes) -> List[str]:
+        cached = self._cache.get(h)
+        if cached is not None:
+            self._cache.move_to_end(h)
+            self.hits += 1
+            return cached
+        if self.broken:
+            return []
+        async with self._sem:
+            try:
+                codes = await asyncio.get_running_loop().run_in_executor(self._get_pool(), decode_image_bytes, data)
+            except ImportError as e:
+                log.error(f"[barcode] decoder unavailable ({e}) -> disabled")
+                self.broken = True
+                return []
+            except BrokenProcessPool as e:
+                log.warning(f"[barcode] worker died ({e}); pool will be recreated")
+                self._pool = None
+                return []
+            except Exception as e:
+                # 壊れた画像など。同じ画像は何度やっても同じなので結果（空）をキャッシュする
+                log.warning(f"[barcode] decode failed: {e}")
+                codes = []
+        self.decoded += 1
+        self._remember(self._cache, h, codes)
+        return codes
+
+    def _remember(self, cache: "OrderedDict[str, List[str]]", key: str, codes: List[str]):
+        cache[key] = codes
+        cache.move_to_end(key)
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    @staticmethod
+    def _attachment_key(a) -> str:
+        # CDN の URL は署名クエリが毎回変わるので、id（無ければクエリを除いた URL＋サイズ）で引く
+        if getattr(a, "id", None):
+            return f"id:{a.id}"
+        return f"url:{(a.url or '').split('?', 1)[0]}:{a.size or 0}"
+
+    async def jans_from_attachments(self, attachments) -> List[str]:
+        """discord.Attachment のうち画像だけ落としてデコード"""
+        out: List[str] = []
+        for a in attachments:
+            if not (a.content_type or "").startswith("image/") or (a.size or 0) > MAX_BYTES:
+                continue
+            key = self._attachment_key(a)
+            codes = self._by_attachment.get(key)
+            if codes is not None:
+                self._by_attachment.move_to_end(key)
+                self.attachment_hits += 1
+            else:
+                try:
+                    data = await a.read()
+                except Exception as e:
+                    log.warning(f"[barcode] download failed: {e}")
+                    continue
+                h = hashlib.sha1(data).hexdigest()
+                codes = await self._decode(h, data)
+                if h in self._cache:  # プールが落ちた等の一時的な失敗は覚えない
+                    self._remember(self._by_attachment, key, codes)
+            for code in codes:
+                if code not in out:
+                    out.append(code)
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "decoded": self.decoded, "cache_hits": self.hits, "attachment_hits": self.attachment_hits,
+            "cached": len(self._cache), "broken": self.broken,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
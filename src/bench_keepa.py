@@ -0,0 +1,91 @@
+# src/bench_keepa.py
+"""
+Keepa 応答の「通常パス（r.json() で全体を dict 化）」と「軽量パス（orjson＋必要項目だけ）」の比較ベンチ。
+計測: 転送バイト数 / パース時間 / 1回あたりのメモリ（tracemalloc のピークと、結果として残るサイズ）
+どちらも本番と同じく「必要項目だけの dict」を返すので、差が出るのはパース時間とピークの方。
+held_kb は返り値しか残らない（パース途中の全体 dict を抱え込んでいない）ことの確認用
+
+例:
+  python -m src.bench_keepa --asin B0XXXXXXXX --save keepa_sample.json   # 実 API（要 KEEPA_API_KEY）
+  python -m src.bench_keepa --fixture keepa_sample.json --repeat 200      # 保存済み応答でオフライン計測
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+from dotenv import load_dotenv, find_dotenv
+
+from .keepa_client import KEEPA_ENDPOINT, _build_params, _pick_current_price, get_session, parse_product_lean
+
+
+def _full_path(body: bytes, asin):
+    # requests.Response.json() 相当（文字列へデコード → 標準 json で全体を dict 化）
+    data = json.loads(body.decode("utf-8"))
+    p = (data.get("products") or [{}])[0]
+    # 本番（fetch_product_from_keepa）と同じく、取り出した項目だけ返して全体の dict は手放す
+    return {"title": p.get("title"), "amazon_price": _pick_current_price(p), "asin": p.get("asin") or asin}
+
+
+def _lean_path(body: bytes, asin):
+    return parse_product_lean(body, asin)
+
+
+def _measure(fn, body: bytes, asin, repeat: int) -> dict:
+    for _ in range(max(1, repeat // 10)):  # ウォームアップ（import・キャッシュの影響を除く）
+        fn(body, asin)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(body, asin)
+    per_call_ms = (time.perf_counter() - t0) / repeat * 1000
+
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    kept = fn(body, asin)  # 呼び出し後も生きているもの（両パスとも取り出した項目だけのはず）
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return {"parse_ms": round(per_call_ms, 3), "peak_kb": round((peak - base) / 1024, 1), "held_kb": round((cur - base) / 1024, 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Keepa full vs lean parse benchmark")
+    ap.add_argument("--asin", action="append", default=[], help="live lookup (repeatable)")
+    ap.add_argument("--fixture", action="append", default=[], help="saved Keepa response JSON (repeatable)")
+    ap.add_argument("--save", help="save the first live response body to this path")
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+    load_dotenv(find_dotenv(), override=True)
+
+    bodies = []
+    for path in args.fixture:
+        with open(path, "rb") as f:
+            bodies.append((path, None, f.read(), None))
+    key = os.getenv("KEEPA_API_KEY", "")
+    for asin in args.asin:
+        r = get_session().get(KEEPA_ENDPOINT, params=_build_params(asin, key, None), timeout=15)
+        r.raise_for_status()
+        wire = r.headers.get("Content-Length")  # gzip 時は圧縮後サイズ
+        bodies.append((asin, asin, r.content, int(wire) if wire else None))
+        if args.save:
+            with open(args.save, "wb") as f:
+                f.write(r.content)
+            args.save = None  # 最初の1件だけ保存
+    if not bodies:
+        ap.error("--asin or --fixture is required")
+
+    for label, asin, body, wire in bodies:
+        full = _measure(_full_path, body, asin, args.repeat)
+        lean = _measure(_lean_path, body, asin, args.repeat)
+        print(json.dumps({
+            "target": label,
+            "bytes": {"decoded": len(body), "wire": wire},
+            "full": full,
+            "lean": lean,
+            "speedup": round(full["parse_ms"] / lean["parse_ms"], 2) if lean["parse_ms"] else None,
+        }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# src/bench_llm_router.py
+"""
+llm_router のヘッジが裾（p99）をどれだけ削るかのシミュレーション。OpenAI には繋がない。
+- _create を偽物に差し替え、1リクエストの所要時間を「対数正規（中央値 --median 秒）＋ --stall-rate の確率で --stall 秒固まる」で引く
+  （固まったリクエストは渡された timeout で打ち切られる＝本物の SDK と同じ）
+- 同じ乱数列で「ヘッジ無し（1本だけ・従来の timeout=30秒）」と routed_chat を比べる。
+  最初の --warmup 件（p95 が計測で決まるまで）は集計から外す
+- 実時間で眠るので、最大 --concurrency 本を同時に流す（既定で1分弱）
+
+例:
+  python -m src.bench_llm_router                       # 150件 / 8% が12秒固まる / 持ち時間 8秒
+  python -m src.bench_llm_router --calls 300 --stall-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from types import SimpleNamespace
+
+from . import llm_router
+from .utils import percentiles
+
+
+class _FakeUpstream:
+    def __init__(self, *, seed: int, median: float, sigma: float, stall_rate: float, stall: float):
+        self.rng = random.Random(seed)
+        self.median = median
+        self.sigma = sigma
+        self.stall_rate = stall_rate
+        self.stall = stall
+
+    def draw(self) -> float:
+        if self.rng.random() < self.stall_rate:
+            return self.stall
+        return self.rng.lognormvariate(0.0, self.sigma) * self.median
+
+    async def create(self, model, messages, max_tokens, temperature, timeout):
+        took = self.draw()
+        await asyncio.sleep(min(took, timeout))
+        if took > timeout:
+            raise asyncio.TimeoutError(f"fake upstream stalled {took:.1f}s")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))], usage=None)
+
+
+async def _run(calls: int, concurrency: int, one) -> list:
+    """calls 件を同時 concurrency 本まで流し、1件ずつの所要時間を投げた順に返す"""
+    sem = asyncio.Semaphore(concurrency)
+    lat = [0.0] * calls
+
+    async def _timed(i: int):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await one()
+            except Exception:
+                pass  # 持ち時間切れも「その時間かかった」として数える
+            lat[i] = time.perf_counter() - t0
+
+    await asyncio.gather(*(_timed(i) for i in range(calls)))
+    return lat
+
+
+def _summary(lat: list, warmup: int) -> dict:
+    return {k: round(v, 2) for k, v in percentiles(lat[warmup:]).items()}
+
+
+async def main_async(args):
+    messages = [{"role": "user", "content": "在庫ある？"}]
+    budget = float(os.getenv("NAGISA_LLM_BUDGET_MENTION", "8"))
+
+    def upstream():
+        return _FakeUpstream(seed=args.seed, median=args.median, sigma=args.sigma, stall_rate=args.stall_rate, stall=args.stall)
+
+    # ヘッジ無し：1本だけ投げて、返るか従来の timeout が切れるまで待つ
+    base = upstream()
+    baseline = await _run(args.calls, args.concurrency, lambda: base.create("m", messages, 100, 0.7, args.baseline_timeout))
+
+    llm_router._create = upstream().create
+    llm_router.tracker = llm_router.LatencyTracker()
+    routed = await _run(
+        args.calls, args.concurrency,
+        lambda: llm_router.routed_chat("mention", messages, max_tokens=100, temperature=0.7),
+    )
+    st = llm_router.tracker.stats()["mention"]
+    print(json.dumps({
+        "calls": args.calls,
+        "stall_rate": args.stall_rate,
+        "budget_sec": budget,
+        "baseline": _summary(baseline, args.warmup),
+        "routed": _summary(routed, args.warmup),
+        "hedged_share": round(st["hedged"] / st["calls"], 3),
+        "hedge_wins": st["hedge_wins"],
+        "retries": st["retries"],
+        "timeouts": st["timeouts"],
+    }, ensure_ascii=False))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="LLM router hedging simulation")
+    ap.add_argument("--calls", type=int, default=150)
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument("--warmup", type=int, default=20, help="leading calls excluded from percentiles")
+    ap.add_argument("--median", type=float, default=0.9, help="median request latency (sec)")
+    ap.add_argument("--sigma", type=float, default=0.35, help="lognormal sigma of request latency")
+    ap.add_argument("--stall-rate", type=float, default=0.08)
+    ap.add_argument("--stall", type=float, default=12.0, help="latency of a stalled request (sec)")
+    ap.add_argument("--baseline-timeout", type=float, default=30.0, help="timeout of the unhedged call (old chat_simple)")
+    ap.add_argument("--seed", type=int, default=39)
+    args = ap.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
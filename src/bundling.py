@@ -0,0 +1,107 @@
+# src/bundling.py
+"""
+束（bundle）を閉じるタイミングの決め方。
+- 完結検出：ID（ASIN/JAN）・価格・店舗がそろった束は、短い猶予だけ置いてすぐ閉じる
+- 打鍵リズム：ユーザーごとのメッセージ間隔を指数移動平均で覚え、無操作待ちを伸び縮みさせる
+- チャンネル別上書き：NAGISA_BUNDLE_CHANNEL_OVERRIDES='{"雑談": 30, "ヤマダ": 10}'（秒）
+"""
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional
+
+from . import hot_config
+from .extract import (
+    ASIN_RE,
+    extract_ids,
+    extract_price_candidate_from_text,
+    lookup_store_by_channel,
+    extract_store_from_comment,
+)
+
+log = logging.getLogger(__name__)
+
+URL_RE = re.compile(r"https?://\S+")
+ASIN_ANYCASE_RE = re.compile(ASIN_RE.pattern, re.IGNORECASE)
+LONG_DIGITS_RE = re.compile(r"\d{7,}")  # JAN/ISBN-13/JAN-8 など。価格（最大6桁）ではない
+
+
+def _strip_ids(text: str) -> str:
+    """ID の中の数字を価格と読まないよう、URL・ASIN/ISBN-10・7桁以上の数字列を空白に置き換える"""
+    text = URL_RE.sub(" ", text)
+    text = ASIN_ANYCASE_RE.sub(" ", text)
+    return LONG_DIGITS_RE.sub(" ", text)
+
+
+def is_complete(texts: List[str], channel_name: str) -> bool:
+    """ID・価格・店舗（コメント or チャンネル由来）が全部そろっているか"""
+    combined = "\n".join(t for t in texts if t)
+    ids = extract_ids(combined)
+    if not (ids.get("asin") or ids.get("jan")):
+        return False
+    if extract_price_candidate_from_text(_strip_ids(combined)) is None:
+        return False
+    snap = hot_config.current()
+    if lookup_store_by_channel(channel_name, snap.channel_index):
+        return True
+    chain, _ = extract_store_from_comment(combined, snap.store_index)
+    return chain is not None
+
+
+class BundlePolicy:
+    def __init__(
+        self,
+        *,
+        complete_grace: float = 0.5,
+        factor: float = 3.0,
+        min_sec: float = 5.0,
+        max_sec: float = 40.0,
+        alpha: float = 0.3,
+        overrides: Optional[Dict[str, float]] = None,
+    ):
+        self.complete_grace = complete_grace
+        self.factor = factor
+        self.min_sec = min_sec
+        self.max_sec = max_sec
+        self.alpha = alpha
+        self.overrides = {k.lower(): float(v) for k, v in (overrides or {}).items()}
+        self._cadence: Dict[int, float] = {}
+
+    @classmethod
+    def from_env(cls) -> "BundlePolicy":
+        overrides = {}
+        raw = os.getenv("NAGISA_BUNDLE_CHANNEL_OVERRIDES", "")
+        if raw:
+            try:
+                overrides = json.loads(raw)
+            except ValueError as e:
+                log.warning(f"[bundle] bad NAGISA_BUNDLE_CHANNEL_OVERRIDES: {e}")
+        return cls(
+            complete_grace=float(os.getenv("NAGISA_BUNDLE_COMPLETE_GRACE_SEC", "0.5")),
+            min_sec=float(os.getenv("NAGISA_BUNDLE_MIN_SEC", "5")),
+            max_sec=float(os.getenv("NAGISA_BUNDLE_MAX_SEC", "40")),
+            overrides=overrides,
+        )
+
+    def observe_gap(self, user_id: int, gap: float):
+        """同じ束の中のメッセージ間隔だけを学習（別の投稿との間隔は混ぜない）"""
+        if gap <= 0 or gap > self.max_sec:
+            return
+        prev = self._cadence.get(user_id)
+        self._cadence[user_id] = gap if prev is None else (1 - self.alpha) * prev + self.alpha * gap
+
+    def inactivity_for(self, user_id: int, channel_name: str, default: float) -> float:
+        o = self.overrides.get((channel_name or "").lower())
+        if o is not None:
+            return o
+        cadence = self._cadence.get(user_id)
+        if cadence is None:
+            return default
+        return min(self.max_sec, max(self.min_sec, cadence * self.factor))
+
+    def delay(self, *, user_id: int, channel_name: str, complete: bool, default: float) -> float:
+        """最後のメッセージから、あと何秒待って閉じるか"""
+        if complete:
+            return self.complete_grace
+        return self.inactivity_for(user_id, channel_name, default)
@@ -13,14 +13,24 @@ class Settings:
     digest_time: str = "08:30"
     channel_map: dict = None
 
+def channel_map_path() -> str:
+    return os.path.join(os.path.dirname(__file__), "channel_map.json")
+
+def store_synonyms_path() -> str:
+    """任意。置いてあれば extract.STORE_SYNONYMS の代わりに使う（ホットリロード対象）"""
+    return os.getenv("NAGISA_STORE_SYNONYMS_PATH", os.path.join(os.path.dirname(__file__), "store_synonyms.json"))
+
+def load_channel_map(path: str = None) -> dict:
+    with open(path or channel_map_path(), "r", encoding="utf-8") as f:
+        return json.load(f)
+
 def load_settings() -> Settings:
     token = os.getenv("DISCORD_BOT_TOKEN", "")
     keepa = os.getenv("KEEPA_API_KEY", "")
     tz = os.getenv("APP_TIMEZONE", "Asia/Tokyo")
     digest = os.getenv("DIGEST_TIME", "08:30")
 
-    with open(os.path.join(os.path.dirname(__file__), "channel_map.json"), "r", encoding="utf-8") as f:
-        channel_map = json.load(f)
+    channel_map = load_channel_map()
 
     return Settings(
         discord_token=token,
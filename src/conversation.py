@@ -0,0 +1,158 @@
+# src/conversation.py
+"""
+メンション会話の文脈（チャンネルごとのリングバッファ）。
+- 直近のやり取りをトークン予算・件数の範囲で持ち、あふれた古い発言は要約にたたんでいく
+- プロンプトは「固定の system（ペルソナ＋サロン前提）→ 要約 → 直近ターン → 今回の発言」の順。
+  先頭が毎回同じ文字列なので、プロバイダ側のプロンプトキャッシュが効く
+- 要約は返信を返したあとにバックグラウンドで作る（返信の待ち時間には乗せない）
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from .utils import percentiles
+
+log = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = """あなたは会話ログの要約係。
+以下の「これまでの要約」と「追加の発言」を合わせて、次の返答に必要な前提だけを日本語で短くまとめる。
+- 誰が何を聞いた/決めた/困っているか、出てきた商品名・店舗・価格は残す
+- 挨拶や雑談の相づちは捨てる
+- 箇条書き5行以内
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """ざっくり見積もり：日本語は1文字≒1トークン、英数字は4文字≒1トークン（＋メッセージ枠の4）"""
+    if not text:
+        return 4
+    ascii_n = sum(1 for c in text if ord(c) < 128)
+    return (len(text) - ascii_n) + ascii_n // 4 + 4
+
+
+@dataclass
+class Turn:
+    role: str        # "user" | "assistant"
+    content: str
+    tokens: int
+    at: float = field(default_factory=time.time)
+
+
+@dataclass
+class ChannelContext:
+    turns: Deque[Turn] = field(default_factory=deque)
+    tokens: int = 0
+    summary: str = ""
+    pending: List[Turn] = field(default_factory=list)   # バッファから押し出され、まだ要約に入っていない発言
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class ConversationBuffer:
+    def __init__(
+        self,
+        *,
+        budget_tokens: int = 1200,
+        max_turns: int = 20,
+        summary_chars: int = 400,
+        idle_reset_sec: float = 6 * 3600,
+        summarize: Optional[Callable[[str, str], Awaitable[str]]] = None,
+    ):
+        self.budget_tokens = budget_tokens
+        self.max_turns = max_turns
+        self.summary_chars = summary_chars
+        self.idle_reset_sec = idle_reset_sec
+        self.summarize = summarize
+        self._ctx: Dict[int, ChannelContext] = {}
+        self._usage: Deque[dict] = deque(maxlen=200)
+
+    @classmethod
+    def from_env(cls, summarize=None) -> "ConversationBuffer":
+        return cls(
+            budget_tokens=int(os.getenv("NAGISA_CHAT_CONTEXT_TOKENS", "1200")),
+            max_turns=int(os.getenv("NAGISA_CHAT_CONTEXT_TURNS", "20")),
+            idle_reset_sec=float(os.getenv("NAGISA_CHAT_CONTEXT_IDLE_SEC", str(6 * 3600))),
+            summarize=summarize,
+        )
+
+    def _get(self, channel_id: int) -> ChannelContext:
+        ctx = self._ctx.get(channel_id)
+        if ctx is None:
+            ctx = self._ctx[channel_id] = ChannelContext()
+        elif ctx.turns and time.time() - ctx.turns[-1].at > self.idle_reset_sec:
+            # 長く空いた会話は別の話題とみなして捨てる
+            self._ctx[channel_id] = ctx = ChannelContext()
+        return ctx
+
+    def add(self, channel_id: int, role: str, content: str):
+        ctx = self._get(channel_id)
+        t = Turn(role=role, content=content, tokens=estimate_tokens(content))
+        ctx.turns.append(t)
+        ctx.tokens += t.tokens
+        # 予算・件数を超えたら古い方から押し出す（最新の1件は必ず残す）
+        while len(ctx.turns) > 1 and (ctx.tokens > self.budget_tokens or len(ctx.turns) > self.max_turns):
+            old = ctx.turns.popleft()
+            ctx.tokens -= old.tokens
+            ctx.pending.append(old)
+
+    def build_messages(self, channel_id: int, system: str, user_content: str) -> List[dict]:
+        """固定の system を先頭、可変部分（要約・直近ターン・今回の発言）を後ろに並べる"""
+        ctx = self._get(channel_id)
+        messages = [{"role": "system", "content": system}]
+        if ctx.summary:
+            messages.append({"role": "system", "content": "# これまでの会話の要約\n" + ctx.summary})
+        messages.extend({"role": t.role, "content": t.content} for t in ctx.turns)
+        messages.append({"role": "user", "content": user_content})
+        return messages
+
+    async def compact(self, channel_id: int):
+        """押し出された発言を要約にたたむ。要約に失敗したら生の発言をつなげ、新しい方だけ残して切り詰める"""
+        ctx = self._ctx.get(channel_id)
+        if ctx is None or not ctx.pending:
+            return
+        async with ctx.lock:
+            pending, ctx.pending = ctx.pending, []
+            if not pending:
+                return
+            lines = "\n".join(("ナギサ: " if t.role == "assistant" else "") + t.content for t in pending)
+            new = None
+            if self.summarize is not None:
+                try:
+                    new = await self.summarize(
+                        SUMMARY_SYSTEM_PROMPT, f"# これまでの要約\n{ctx.summary or '（なし）'}\n\n# 追加の発言\n{lines}"
+                    )
+                except Exception as e:
+                    log.warning(f"[chat] summarize failed: {e}")
+            if not new:
+                new = (ctx.summary + "\n" + lines).strip()
+            ctx.summary = new[-self.summary_chars:]
+            log.info(f"[chat] ch={channel_id} folded {len(pending)} turns into summary ({len(ctx.summary)} chars)")
+
+    # ---- 計測 ----
+    def record_usage(self, channel_id: int, usage: dict):
+        self._usage.append(usage)
+        prompt = usage.get("prompt_tokens") or 0
+        cached = usage.get("cached_tokens") or 0
+        share = cached / prompt if prompt else 0.0
+        log.info(
+            f"[chat] ch={channel_id} prompt_tokens={prompt} cached={cached} ({share:.0%}) "
+            f"completion={usage.get('completion_tokens', 0)} latency={usage.get('latency', 0.0):.2f}s"
+        )
+
+    def stats(self) -> dict:
+        if not self._usage:
+            return {"replies": 0}
+        prompt = sum(u.get("prompt_tokens") or 0 for u in self._usage)
+        cached = sum(u.get("cached_tokens") or 0 for u in self._usage)
+        lat = percentiles([u.get("latency", 0.0) for u in self._usage], qs=(50, 95))
+        return {
+            "replies": len(self._usage),
+            "avg_prompt_tokens": round(prompt / len(self._usage)),
+            "cached_share": round(cached / prompt, 2) if prompt else 0.0,
+            "latency_p50": round(lat["p50"], 2),
+            "latency_p95": round(lat["p95"], 2),
+            "channels": len(self._ctx),
+        }
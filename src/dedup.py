@@ -0,0 +1,84 @@
+# src/dedup.py
+"""
+直近の重複投稿を束ねる時間窓インデックス。
+キー = (ASIN/JAN, store_chain, store_branch, buy_price)。
+窓を n 個のバケット（dict）に分けて持ち、古いバケットは丸ごと捨てるので、
+期限切れの掃除は O(1)・メモリは「窓の中の件数」ぶんだけ。
+"""
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Set, Tuple
+
+DedupKey = Tuple[str, str, str, int]
+
+
+def make_key(item_id: str, store_chain: Optional[str], store_branch: Optional[str], buy_price: Optional[int]) -> DedupKey:
+    return (item_id, store_chain or "", store_branch or "", int(buy_price or 0))
+
+
+@dataclass
+class DedupEntry:
+    keepa: dict                                   # 使い回す Keepa 結果（title / amazon_price / asin）
+    reporters: Set[int] = field(default_factory=set)
+    sheet_ref: Optional[Tuple[str, int]] = None   # (シート名, 行番号)。追記完了まで None
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def count(self) -> int:
+        return len(self.reporters)
+
+
+class DedupWindow:
+    def __init__(self, window_sec: float = 900.0, n_buckets: int = 6, max_items: int = 20000):
+        self.bucket_sec = window_sec / n_buckets
+        self.n_buckets = n_buckets
+        self.max_items = max_items
+        self._buckets: Deque[Dict[DedupKey, DedupEntry]] = deque([{}])
+        self._bucket_start = time.time()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "DedupWindow":
+        return cls(
+            window_sec=float(os.getenv("NAGISA_DEDUP_WINDOW_SEC", "900")),
+            n_buckets=int(os.getenv("NAGISA_DEDUP_BUCKETS", "6")),
+        )
+
+    def _rotate(self, now: float):
+        steps = int((now - self._bucket_start) // self.bucket_sec)
+        if steps <= 0:
+            return
+        if steps >= self.n_buckets:
+            # 窓より長く空いた → 全部期限切れ
+            self._buckets = deque([{}])
+        else:
+            for _ in range(steps):
+                self._buckets.append({})
+                if len(self._buckets) > self.n_buckets:
+                    self._buckets.popleft()
+        self._bucket_start += steps * self.bucket_sec
+
+    def __len__(self) -> int:
+        return sum(len(b) for b in self._buckets)
+
+    def get(self, key: DedupKey) -> Optional[DedupEntry]:
+        self._rotate(time.time())
+        for b in reversed(self._buckets):
+            e = b.get(key)
+            if e is not None:
+                self.hits += 1
+                return e
+        self.misses += 1
+        return None
+
+    def put(self, key: DedupKey, entry: DedupEntry):
+        self._rotate(time.time())
+        if len(self) >= self.max_items and len(self._buckets) > 1:
+            self._buckets.popleft()  # 上限超えは一番古いバケットから捨てる
+        self._buckets[-1][key] = entry
+
+    def stats(self) -> dict:
+        return {"items": len(self), "hits": self.hits, "misses": self.misses}
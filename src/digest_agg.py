@@ -0,0 +1,142 @@
+# src/digest_agg.py
+"""
+日次まとめ用の集計（列指向・NumPy）。
+1日ぶんの products レコード（Sheets の行 dict）を列に分けて、group-by を配列演算でまとめて行う。
+- チェーン別の件数 / 差額（Amazon参考 − 仕入れ値）の最小・中央値
+- 商品（ASIN、無ければ JAN）別の投稿者数・投稿数 → 上位 N
+- 同じ商品の重複を1行に畳む（代表行は最初の投稿）
+- 要 numpy（available() が False なら呼び出し側で一覧モードに戻す）
+"""
+import importlib.util
+import re
+from typing import Any, Dict, List, Optional
+
+_NUM_RE = re.compile(r"[^\d.\-]")
+_AVAILABLE = importlib.util.find_spec("numpy") is not None  # 任意依存
+
+
+def available() -> bool:
+    return _AVAILABLE
+
+
+def _num(v) -> float:
+    """Sheets の値（"¥1,980" / "1980" / "" など）を float に。読めなければ NaN。"""
+    if v is None:
+        return float("nan")
+    if isinstance(v, (int, float)):
+        return float(v)
+    s = _NUM_RE.sub("", str(v))
+    try:
+        return float(s) if s else float("nan")
+    except ValueError:
+        return float("nan")
+
+
+def _group_min_median(groups, values, n_groups: int):
+    """groups(int) ごとの min / median をソート1回で求める（値が無いグループは NaN）"""
+    import numpy as np
+    mins = np.full(n_groups, np.nan)
+    meds = np.full(n_groups, np.nan)
+    ok = ~np.isnan(values)
+    if not ok.any():
+        return mins, meds
+    g = groups[ok]
+    v = values[ok]
+    order = np.lexsort((v, g))                 # グループ → 値 の順に並べる
+    g, v = g[order], v[order]
+    present, start, count = np.unique(g, return_index=True, return_counts=True)
+    mins[present] = v[start]
+    meds[present] = (v[start + (count - 1) // 2] + v[start + count // 2]) / 2
+    return mins, meds
+
+
+def aggregate(records: List[Dict[str, Any]], top_n: int = 10) -> Dict[str, Any]:
+    import numpy as np
+    n = len(records)
+    if n == 0:
+        return {"posts": 0, "unique_items": 0, "posters": 0, "chains": [], "top_items": []}
+
+    chain = np.array([(r.get("store_chain") or "不明") for r in records], dtype=object)
+    item = np.array([(r.get("asin") or r.get("jan") or "") for r in records], dtype=object)
+    user = np.array([(r.get("user") or "") for r in records], dtype=object)
+    buy = np.array([_num(r.get("buy_price")) for r in records], dtype=np.float64)
+    amz = np.array([_num(r.get("amazon_price")) for r in records], dtype=np.float64)
+    spread = amz - buy  # どちらか欠けていれば NaN
+
+    # ---- チェーン別 ----
+    chains, chain_idx, chain_cnt = np.unique(chain.astype(str), return_inverse=True, return_counts=True)
+    spread_min, spread_med = _group_min_median(chain_idx, spread, len(chains))
+    order = np.argsort(-chain_cnt, kind="stable")
+    chain_rows = [
+        {
+            "chain": str(chains[i]),
+            "count": int(chain_cnt[i]),
+            "spread_min": None if np.isnan(spread_min[i]) else int(spread_min[i]),
+            "spread_median": None if np.isnan(spread_med[i]) else int(spread_med[i]),
+        }
+        for i in order
+    ]
+
+    # ---- 商品別（ID 無しは集計対象外）----
+    has_id = item != ""
+    top_items = []
+    unique_items = 0
+    if has_id.any():
+        rec_idx = np.flatnonzero(has_id)
+        items, first, item_idx = np.unique(item[has_id].astype(str), return_index=True, return_inverse=True)
+        unique_items = len(items)
+        _, user_idx = np.unique(user[has_id].astype(str), return_inverse=True)
+        posts = np.bincount(item_idx, minlength=len(items))
+        # (商品, 投稿者) の組を一意化してから数える → 投稿者数
+        pairs = np.unique(np.stack([item_idx, user_idx], axis=1), axis=0)
+        posters = np.bincount(pairs[:, 0], minlength=len(items))
+        buy_min, _ = _group_min_median(item_idx, buy[has_id], len(items))
+        # 投稿者数 → 投稿数 の降順
+        rank = np.lexsort((-posts, -posters))[:top_n]
+        for i in rank:
+            rep = records[rec_idx[first[i]]]
+            chains_for_item = np.unique(chain[has_id][item_idx == i].astype(str))
+            top_items.append({
+                "id": str(items[i]),
+                "title": rep.get("title") or "不明",
+                "amazon_price": None if np.isnan(amz[rec_idx[first[i]]]) else int(amz[rec_idx[first[i]]]),
+                "buy_min": None if np.isnan(buy_min[i]) else int(buy_min[i]),
+                "posters": int(posters[i]),
+                "posts": int(posts[i]),
+                "chains": [str(c) for c in chains_for_item],
+            })
+
+    return {
+        "posts": n,
+        "unique_items": unique_items,
+        "posters": int(len(np.unique(user.astype(str)))),
+        "chains": chain_rows,
+        "top_items": top_items,
+    }
+
+
+def _yen(v: Optional[int]) -> str:
+    return "—" if v is None else f"¥{v:,}"
+
+
+def format_chain_lines(agg: Dict[str, Any], limit: int = 12) -> str:
+    lines = []
+    for c in agg["chains"][:limit]:
+        extra = ""
+        if c["spread_median"] is not None:
+            extra = f"（差額 最小{_yen(c['spread_min'])} / 中央{_yen(c['spread_median'])}）"
+        lines.append(f"・{c['chain']}：{c['count']}件{extra}")
+    rest = len(agg["chains"]) - limit
+    if rest > 0:
+        lines.append(f"・ほか {rest} チェーン")
+    return "\n".join(lines)
+
+
+def format_item_field(it: Dict[str, Any]) -> tuple:
+    name = f"{it['title']}"[:256]
+    value = (
+        f"ID: `{it['id']}` / 投稿者 {it['posters']}人（{it['posts']}件）\n"
+        f"Amazon参考: {_yen(it['amazon_price'])} / 最安仕入れ: {_yen(it['buy_min'])}\n"
+        f"店舗: {', '.join(it['chains'])[:200]}"
+    )
+    return name, value
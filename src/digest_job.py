@@ -3,10 +3,10 @@ import asyncio
 import discord
 import logging
 import os
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import time
 from .sheets_client import fetch_yesterday_records
 from .openai_client import chat_simple
-from .persona import SYSTEM_PROMPT
+from .persona import system_prompt
 
 log = logging.getLogger(__name__)
 
@@ -30,6 +30,68 @@ def _parse_hhmm(value: str, default: str) -> tuple[int,int]:
         dh, dm = [int(x) for x in default.split(":")]
         return dh, dm
 
+def _summary_mode() -> bool:
+    if os.getenv("NAGISA_DIGEST_MODE", "list") != "summary":
+        return False
+    from .digest_agg import available  # numpy の有無
+    if not available():
+        log.warning("[digest] summary mode needs numpy -> falling back to list")
+        return False
+    return True
+
+async def _one_liner(tops: list) -> str:
+    context = "・" + "\n・".join(tops)
+    user_prompt = (
+        "昨日の商材トップ（抜粋）です。全体の雰囲気が伝わる一言コメントを、"
+        "可愛く・励まし系で2行以内で。最後にハートか星を1個だけ付けてください。\n\n" + context
+    )
+    try:
+        one_liner = await chat_simple(system_prompt(), user_prompt, route="digest")
+        log.info("[digest] GPT one-liner generated")
+    except Exception as e:
+        log.warning(f"[digest] GPT fallback: {e}")
+        one_liner = "きのうもたくさんの投稿、ありがとうございます✨"
+    return one_liner
+
+async def _post_summary_digest(target, records: list):
+    """チェーン別件数・差額・上位商品を Embed にまとめて投稿（長すぎる分は続きの Embed へ）"""
+    from .digest_agg import aggregate
+    top_n = int(os.getenv("NAGISA_DIGEST_TOP_N", "10"))
+    t0 = time.perf_counter()
+    agg = await asyncio.to_thread(aggregate, records, min(top_n, 20))
+    log.info(f"[digest] aggregated {len(records)} records in {(time.perf_counter()-t0)*1000:.1f}ms")
+
+    tops = [f"{it['title']}（{', '.join(it['chains'][:2])}）" for it in agg["top_items"][:6]]
+    for i, embed in enumerate(_summary_embeds(agg, await _one_liner(tops))):
+        if i:
+            await asyncio.sleep(1.5)  # Discord API制限回避（一覧モードと同じ間隔）
+        await target.send(embed=embed)
+
+EMBED_TOTAL_LIMIT = 6000  # Discord: 1メッセージ内の Embed 合計文字数（title/description/fields/footer）の上限
+EMBED_MAX_FIELDS = 25
+
+def _summary_embeds(agg: dict, footer: str) -> list:
+    """集計を Embed にする。合計 6000 字（・25 フィールド）を超える分は「続き」の Embed に分ける（1通1枚で送る）"""
+    from .digest_agg import format_chain_lines, format_item_field
+    title = f"🌅 昨日の商材まとめ（{agg['posts']}件 / {agg['unique_items']}商品 / {agg['posters']}人）"
+    footer = footer[:2048]
+    embeds = [discord.Embed(
+        title=title,
+        description="お兄さま＆みなさま、昨日もおつかれさまでした！\n\n**店舗チェーン別**\n" + format_chain_lines(agg),
+        color=0x4A90E2,
+        timestamp=datetime.now(JST),
+    )]
+    for it in agg["top_items"]:
+        name, value = format_item_field(it)
+        cur = embeds[-1]
+        # フッターは最後の Embed に付けるので、どの Embed でもその分を空けておく
+        if len(cur) + len(name) + len(value) + len(footer) > EMBED_TOTAL_LIMIT or len(cur.fields) >= EMBED_MAX_FIELDS:
+            cur = discord.Embed(title=f"{title}（続き）", color=0x4A90E2)
+            embeds.append(cur)
+        cur.add_field(name=name, value=value, inline=False)
+    embeds[-1].set_footer(text=footer)
+    return embeds
+
 async def post_daily_digest(bot: discord.Client):
     try:
         records = await asyncio.to_thread(fetch_yesterday_records)
@@ -45,6 +107,11 @@ async def post_daily_digest(bot: discord.Client):
         log.warning("[digest] target channel 'bot-log' not found -> skip")
         return
 
+    # 集計モード：全件列挙の代わりに、集計＋上位N件を1通で出す
+    if _summary_mode():
+        await _post_summary_digest(target, records)
+        return
+
     # 1ページあたり最大25件（Embedの仕様）
     PAGE_SIZE = 25
     total_pages = (len(records) + PAGE_SIZE - 1) // PAGE_SIZE
@@ -76,18 +143,7 @@ async def post_daily_digest(bot: discord.Client):
         # 1ページ目だけナギサの一言を生成してフッターにつける
         if page == 0:
             tops = [f"{(r.get('title') or '不明')}（{r.get('store_chain') or '—'}）" for r in records[:6]]
-            context = "・" + "\n・".join(tops)
-            user_prompt = (
-                "昨日の商材トップ（抜粋）です。全体の雰囲気が伝わる一言コメントを、"
-                "可愛く・励まし系で2行以内で。最後にハートか星を1個だけ付けてください。\n\n" + context
-            )
-            try:
-                one_liner = await chat_simple(SYSTEM_PROMPT, user_prompt)
-                log.info("[digest] GPT one-liner generated")
-            except Exception as e:
-                log.warning(f"[digest] GPT fallback: {e}")
-                one_liner = "きのうもたくさんの投稿、ありがとうございます✨"
-            embed.set_footer(text=one_liner)
+            embed.set_footer(text=await _one_liner(tops))
 
         await target.send(embed=embed)
         await asyncio.sleep(1.5)  # Discord API制限回避（安全間隔）
@@ -99,6 +155,7 @@ async def ensure_scheduler_started(bot: discord.Client):
     """
     if getattr(bot, "_nagisa_sched", None):
         return
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler  # 初回起動時に import
     loop = asyncio.get_running_loop()
     sched = AsyncIOScheduler(event_loop=loop, timezone=JST)
 
@@ -119,6 +176,7 @@ async def ensure_scheduler_started(bot: discord.Client):
     sched.print_jobs()
 
 def setup_scheduler(bot: discord.Client):
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
     sched = AsyncIOScheduler(timezone=JST)
     sched.add_job(post_daily_digest, "cron", hour=0, minute=58, args=[bot])
     sched.start()
@@ -4,24 +4,34 @@ import logging
 import time
 from dataclasses import dataclass, field
 from typing import Optional,List, Dict, Tuple
-from .sheets_client import append_product
-from .openai_client import chat_simple
-from .persona import SYSTEM_PROMPT, role_address
+from .sheets_client import append_product, update_report_count
+from .openai_client import chat_simple, chat_messages
+from .persona import system_prompt, role_address
 import os
 import discord
 
 BUNDLE_INACTIVITY_SEC = 20
 BUNDLE_MAX_WINDOW_SEC = 120
+MAX_OPEN_BUNDLES = int(os.getenv("NAGISA_MAX_OPEN_BUNDLES", "500"))
 
-from .extract import (
-    extract_ids,
-    extract_price_candidate_from_text,
-    normalize_store_by_channel,
-    extract_store_from_comment
-)
+BUSY_CHAT = "いまちょっと混み合ってて、お返事が追いつかないの…💦 落ち着いたらまた呼んでねっ。"
+BUSY_BUNDLE = "いま投稿が集中してて、この報告は処理しきれなかったの…🙏 少し時間をおいてもう一度貼ってもらえる？"
+
+from .pipeline import BundleJob, extract_local
 from .keepa_client import fetch_product_from_keepa
 from .utils import now_jst
 from .digest_job import ensure_scheduler_started
+from .loop_monitor import LoopMonitor
+from . import startup, hot_config, llm_router
+from .work_queue import WorkQueue
+from . import keepa_history
+from .product_index import ProductIndex, parse_query, format_hits
+from .dedup import DedupWindow, DedupEntry, make_key
+from .bundling import BundlePolicy, is_complete
+from .conversation import ConversationBuffer
+from .admission import AdmissionController
+from .extract import extract_ids
+from . import barcode
 
 log = logging.getLogger(__name__)
 
@@ -41,37 +51,143 @@ class NagisaDiscordBot(discord.Client):
         owner_ids = set(int(x) for x in os.getenv("NAGISA_OWNER_IDS","").split(",") if x.strip().isdigit())
         self.owner_ids = owner_ids
         self.keepa_key = keepa_key
-        self.channel_map = channel_map
+        hot_config.install(hot_config.build_snapshot(channel_map))
+        self.config_watcher: Optional[hot_config.ConfigWatcher] = None
         self.bundles: Dict[Tuple[int, int], Bundle] = {}
+        self.loop_monitor: Optional[LoopMonitor] = None
+        # NAGISA_MODE=gateway: 束はキューへ積むだけにして、処理は src.worker に任せる
+        self.work_queue: Optional[WorkQueue] = WorkQueue() if os.getenv("NAGISA_MODE") == "gateway" else None
+        self._outbox_task: Optional[asyncio.Task] = None
+        # 過去投稿のローカル検索（任意）。!search で引く
+        self.product_index: Optional[ProductIndex] = ProductIndex() if os.getenv("NAGISA_INDEX") == "1" else None
+        # 同じ商品・店舗・価格の連続報告をまとめる時間窓（任意）
+        self.dedup: Optional[DedupWindow] = DedupWindow.from_env() if os.getenv("NAGISA_DEDUP") == "1" else None
+        # 束の閉じ方を投稿の完結度・打鍵リズム・チャンネルで変える（任意）。オフなら固定の BUNDLE_INACTIVITY_SEC
+        self.bundle_policy: Optional[BundlePolicy] = BundlePolicy.from_env() if os.getenv("NAGISA_ADAPTIVE_BUNDLE") == "1" else None
+        # 混雑時の受付制御（任意）。束の処理 > Sheets > 会話 の順に枠を配り、あふれた会話は「混んでるよ」で返す
+        self.admission: Optional[AdmissionController] = AdmissionController.from_env() if os.getenv("NAGISA_ADMISSION") == "1" else None
+        # 添付画像のバーコード読み取り（任意・要 Pillow/pyzbar）。重い処理は別プロセス
+        self.barcode: Optional[barcode.BarcodeReader] = barcode.BarcodeReader.from_env() if barcode.enabled() else None
+        if os.getenv("NAGISA_BARCODE") == "1" and self.barcode is None:
+            log.warning("[barcode] NAGISA_BARCODE=1 but Pillow/pyzbar is not installed -> disabled")
+        # メンション会話の文脈（任意）。オフなら従来どおり今回の発言だけを送る
+        self.conversation: Optional[ConversationBuffer] = (
+            ConversationBuffer.from_env(summarize=lambda system, text: chat_simple(system, text))
+            if os.getenv("NAGISA_CHAT_CONTEXT") == "1" else None
+        )
+
+    @property
+    def channel_map(self) -> dict:
+        # ホットリロードで差し替わるので常に最新スナップショットから引く
+        return hot_config.current().channel_map
+
+    async def close(self):
+        # バーコード用の spawn プロセスを残さない
+        if self.barcode is not None:
+            self.barcode.shutdown()
+        await super().close()
 
     async def on_ready(self):
         log.info(f"✅ Logged in as {self.user} (id={self.user.id}) at {now_jst()}")
+        if not getattr(self, "_nagisa_ready_once", False):
+            self._nagisa_ready_once = True
+            startup.mark("ready")
+            # 高速起動モード：初回の本番リクエストより先に各バックエンドを温める
+            if startup.fast_startup_enabled():
+                asyncio.create_task(startup.prewarm_backends(self.keepa_key))
+        # ループ監視（任意）：スケジューラより先に立ち上げて、ジョブ実行中の遅延もラベル付けする
+        if os.getenv("NAGISA_LOOP_MONITOR") == "1" and self.loop_monitor is None:
+            self.loop_monitor = LoopMonitor.from_env()
+            self.loop_monitor.start()
+            every = float(os.getenv("NAGISA_LOOP_MONITOR_LOG_SEC", "300"))
+            if every > 0:
+                asyncio.create_task(self.loop_monitor.log_periodically(every))
+        # channel_map / STORE_SYNONYMS / サロンメモのホットリロード（任意）
+        if os.getenv("NAGISA_HOT_RELOAD") == "1" and self.config_watcher is None:
+            self.config_watcher = hot_config.ConfigWatcher(poll_sec=float(os.getenv("NAGISA_HOT_RELOAD_POLL_SEC", "5")))
+            self.config_watcher.start()
+        if self.work_queue is not None and self._outbox_task is None:
+            self._outbox_task = asyncio.create_task(self._drain_outbox())
+            log.info(f"[gateway] queue={self.work_queue.path}; bundles are handled by src.worker")
+        if self.product_index is not None and not self.product_index.docs:
+            asyncio.create_task(asyncio.to_thread(self.product_index.refresh))  # 初回検索を待たせないよう先読み
         # イベントループが立った後にスケジューラを開始
         await ensure_scheduler_started(self)
+        sched = getattr(self, "_nagisa_sched", None)
+        if self.loop_monitor and sched and not getattr(sched, "_nagisa_loopmon", False):
+            self.loop_monitor.attach_scheduler(sched)
+            sched._nagisa_loopmon = True
 
+    async def _handle_command(self, message: discord.Message, content: str) -> bool:
+        """`!health` などの管理コマンド。処理したら True。"""
+        if content == "!health" and message.author.id in self.owner_ids:
+            parts = []
+            if not self.loop_monitor:
+                parts.append("ループ監視はオフだよ（`NAGISA_LOOP_MONITOR=1` で有効化）")
+            else:
+                parts.append(self.loop_monitor.format_snapshot())
+            if self.work_queue is not None:
+                depth = await asyncio.to_thread(self.work_queue.depth)
+                parts.append(f"📮 ワーカーキュー：{depth}")
+            if self.dedup is not None:
+                parts.append(f"👥 重複窓：{self.dedup.stats()}")
+            if self.conversation is not None:
+                parts.append(f"💬 会話：{self.conversation.stats()}")
+            if self.admission is not None:
+                parts.append(f"🚦 受付制御：{self.admission.stats()} 開いている束={len(self.bundles)}")
+            if self.barcode is not None:
+                parts.append(f"📷 バーコード：{self.barcode.stats()}")
+            if llm_router.enabled():
+                parts.append(f"🧠 LLM経路：{llm_router.tracker.stats()}")
+            await message.reply("\n".join(parts), mention_author=False)
+            return True
+        cmd, _, args = content.partition(" ")
+        if cmd in ("!search", "!find") and self.product_index is not None:
+            q = parse_query(args)
+            if not q["query"]:
+                await message.reply("使い方：`!search 商品名/ASIN/JAN store:チェーン since:YYYY-MM-DD`", mention_author=False)
+                return True
+            t0 = time.perf_counter()
+            hits = await asyncio.to_thread(self._index_lookup, q)
+            log.info(f"[index] search '{q['query']}' -> {len(hits)} hits in {(time.perf_counter()-t0)*1000:.1f}ms")
+            await message.reply(format_hits(hits, q["query"]), mention_author=False)
+            return True
+        return False
 
+    async def _chat_with_context(self, message: discord.Message, who: str, content: str, user_prompt: str) -> str:
+        """直近の会話を添えて返答し、今回のやり取りをバッファに積む（要約は返信後に裏で）"""
+        conv = self.conversation
+        ch = message.channel.id
+        messages = conv.build_messages(ch, system_prompt(), user_prompt)
+        reply, usage = await chat_messages(messages, route="mention")
+        conv.record_usage(ch, usage)
+        conv.add(ch, "user", f"{who}（{message.author.display_name}）: {content}")
+        conv.add(ch, "assistant", reply)
+        asyncio.create_task(conv.compact(ch))
+        return reply
+
+    def _index_lookup(self, q: dict) -> list:
+        self.product_index.refresh()  # ワーカー等が追記した分を読み足す
+        return self.product_index.search(q["query"], store=q["store"], since=q["since"])
 
     async def on_message(self, message: discord.Message):
         if message.author.bot:
             return
 
         content = (message.content or "").strip()
+        if content.startswith("!") and await self._handle_command(message, content):
+            return
         mentioned_me = self.user.mentioned_in(message)
         called_name = ("ナギサ" in content) or content.lower().startswith("nagisa:")
 
         if mentioned_me or called_name:
-            who = role_address(message.author.id, self.owner_ids)
-            # 会話の前提（必要なら短く追加）
-            user_prompt = f"{who}からのメッセージ:\n{content}\n\n返答は3行以内で。必要なら箇条書き。"
-            try:
-                reply = await chat_simple(SYSTEM_PROMPT, user_prompt)
-                await message.reply(reply, mention_author=False)
-            except Exception as e:
-                log.warning(f"chat reply failed: {e}")
-                fallback = "いまナギサのおしゃべり頭脳に接続が集中してるみたい…💦 抽出や記録は動いてるから、もう少ししたらまた呼んでねっ。"
-                await message.reply(fallback, mention_author=False)
-                # 管理者（お兄さま）にはDMで詳細通知してもOK
-                # 会話のときはここで終了（商材抽出とは独立）
+            if self.admission is None:
+                await self._chat_reply(message, content)
+            elif not self.admission.submit(
+                "chat", message.channel.id, lambda: self._chat_reply(message, content),
+                on_shed=lambda: self._busy_note(message, BUSY_CHAT),
+            ):
+                await self._busy_note(message, BUSY_CHAT)
             # 商材投稿と会話を混ぜる場合はこのreturnを外してOK
             return
 
@@ -81,103 +197,260 @@ class NagisaDiscordBot(discord.Client):
 
         # 既存のbundleがなければ新規作成
         if not b:
+            if self.admission is not None and len(self.bundles) >= MAX_OPEN_BUNDLES:
+                self._close_oldest_bundle()
             b = Bundle(channel_id=message.channel.id, user_id=message.author.id)
             self.bundles[key] = b
+        elif self.bundle_policy is not None:
+            self.bundle_policy.observe_gap(message.author.id, now - b.last_at)
         b.messages.append(message)
         b.last_at = now
 
         # 古いタスクをキャンセルして再タイマー
         if b.task and not b.task.done():
             b.task.cancel()
-        b.task = asyncio.create_task(self._bundle_timer(key))
+        b.task = asyncio.create_task(self._bundle_timer(key, self._bundle_wait(b, message)))
 
-    async def _bundle_timer(self, key: Tuple[int, int]):
+    async def _chat_reply(self, message: discord.Message, content: str):
+        who = role_address(message.author.id, self.owner_ids)
+        # 会話の前提（必要なら短く追加）
+        user_prompt = f"{who}からのメッセージ:\n{content}\n\n返答は3行以内で。必要なら箇条書き。"
         try:
-            while True:
-                await asyncio.sleep(1)
-                b = self.bundles.get(key)
-                if not b:
-                    return
-                now = time.time()
-                if (now - b.last_at) >= BUNDLE_INACTIVITY_SEC or (now - b.created_at) >= BUNDLE_MAX_WINDOW_SEC:
-                    await self.flush_bundle(key)
-                    return
+            t0 = time.time()
+            if self.conversation is None:
+                reply = await chat_simple(system_prompt(), user_prompt, route="mention")
+            else:
+                reply = await self._chat_with_context(message, who, content, user_prompt)
+            await message.reply(reply, mention_author=False)
+            startup.first_reply("chat", time.time() - t0)
+        except Exception as e:
+            log.warning(f"chat reply failed: {e}")
+            fallback = "いまナギサのおしゃべり頭脳に接続が集中してるみたい…💦 抽出や記録は動いてるから、もう少ししたらまた呼んでねっ。"
+            await message.reply(fallback, mention_author=False)
+            # 管理者（お兄さま）にはDMで詳細通知してもOK
+            # 会話のときはここで終了（商材抽出とは独立）
+
+    async def _busy_note(self, message: discord.Message, text: str):
+        try:
+            await message.reply(text, mention_author=False)
+        except Exception as e:
+            log.warning(f"busy note failed: {e}")
+
+    def _close_oldest_bundle(self):
+        """開いている束が上限に達したら、一番古い束を待たずに閉じる（メモリを青天井にしない）"""
+        key = min(self.bundles, key=lambda k: self.bundles[k].last_at)
+        # その場で外す（flush を待つ間に次の投稿が来ても、上限の判定・同じ束への追記に使われない）
+        old = self.bundles.pop(key)
+        if old.task and not old.task.done():
+            old.task.cancel()
+        log.info(f"[admission] too many open bundles; closing {key} early")
+        asyncio.create_task(self._dispatch_bundle(old))
+
+    def _bundle_wait(self, b: Bundle, message: discord.Message) -> float:
+        """いまから何秒後に束を閉じるか（無操作待ちと最大窓の早い方）"""
+        inactivity = BUNDLE_INACTIVITY_SEC
+        if self.bundle_policy is not None:
+            channel_name = getattr(message.channel, "name", "") or ""
+            complete = is_complete([m.content for m in b.messages if m.content], channel_name)
+            inactivity = self.bundle_policy.delay(
+                user_id=b.user_id, channel_name=channel_name, complete=complete, default=BUNDLE_INACTIVITY_SEC
+            )
+        deadline = min(b.last_at + inactivity, b.created_at + BUNDLE_MAX_WINDOW_SEC)
+        return max(0.0, deadline - time.time())
+
+    async def _bundle_timer(self, key: Tuple[int, int], wait: float):
+        try:
+            await asyncio.sleep(wait)
+            if key in self.bundles:
+                await self.flush_bundle(key)
         except asyncio.CancelledError:
             return
 
+    def _job_from_bundle(self, b: Bundle) -> BundleJob:
+        channel_obj = self.get_channel(b.channel_id)
+        first = b.messages[0].author
+        return BundleJob(
+            texts=[m.content for m in b.messages if m.content],
+            channel_id=b.channel_id,
+            channel_name=channel_obj.name if channel_obj else "",
+            user_id=b.user_id,
+            user=f"{first.name}#{first.discriminator}",
+            reply_to=b.messages[-1].id,
+            created_at=b.created_at,
+        )
+
     async def flush_bundle(self, key: Tuple[int, int]):
         b = self.bundles.pop(key, None)
-        if not b or not b.messages:
+        if b:
+            await self._dispatch_bundle(b)
+
+    async def _dispatch_bundle(self, b: Bundle):
+        """束から外したものを処理へ回す（受付制御ありなら extract 段に積む）"""
+        if not b.messages:
             return
+        t_flush = time.time()
+        if self.admission is None:
+            await self._process_bundle(b, t_flush)
+        elif not self.admission.submit(
+            "extract", b.user_id, lambda: self._process_bundle(b, t_flush),
+            on_shed=lambda: self._busy_note(b.messages[-1], BUSY_BUNDLE),
+        ):
+            await self._busy_note(b.messages[-1], BUSY_BUNDLE)
 
-        # 全メッセージ結合
-        texts = [m.content for m in b.messages if m.content]
-        combined = "\n".join(texts)
-        log.info(f"[bundle] flush user={b.user_id} ch={b.channel_id} lines={len(texts)}")
+    async def _process_bundle(self, b: Bundle, t_flush: float):
+        job = self._job_from_bundle(b)
+        if self.barcode is not None:
+            await self._add_barcode_jans(b, job)
+        log.info(f"[bundle] flush user={b.user_id} ch={b.channel_id} lines={len(job.texts)}")
 
-        ids = extract_ids(combined)
-        asin = ids.get("asin")
-        jan = ids.get("jan")
+        two_phase = os.getenv("NAGISA_TWO_PHASE_REPLY") == "1"
 
-        channel_obj = self.get_channel(b.channel_id)
-        store_chain_from_channel = normalize_store_by_channel(channel_obj.name if channel_obj else "", self.channel_map)
-        store_chain_from_comment, store_branch = extract_store_from_comment(combined)
-        store_chain = store_chain_from_comment or store_chain_from_channel
-        price_candidate = extract_price_candidate_from_text(combined)
-
-        log.info(f"[bundle] ids: asin={asin} jan={jan} price={price_candidate}")
-        title, amazon_price = None, None
-        if asin or jan:
+        # ゲートウェイモード：束をキューに積むだけ（抽出・Keepa・Sheets はワーカー側）
+        if self.work_queue is not None:
+            if two_phase:
+                # 手元の抽出だけで先に返信し、ワーカーにはその返信を編集してもらう
+                res = extract_local(job)
+                if not res.has_id:
+                    log.info(f"[bundle] skip: no ASIN/JAN found (price={res.price_candidate})")
+                    return
+                ack = await self._reply_bundle(b.messages[-1], res.reply_text(pending="⏳ 順番待ち中…"), t_flush)
+                job.ack_id = ack.id if ack is not None else None
+            await asyncio.to_thread(self.work_queue.push_job, "bundle", job.to_dict())
+            return
+
+        res = extract_local(job)
+        log.info(f"[bundle] ids: asin={res.asin} jan={res.jan} price={res.price_candidate}")
+        if not res.has_id:
+            log.info(f"[bundle] skip: no ASIN/JAN found (price={res.price_candidate})")
+            return
+        dedup_key, entry, keepa, ack = None, None, None, None
+        if self.dedup is not None:
+            dedup_key = make_key(res.asin or res.jan, res.store_chain, res.store_branch, res.price_candidate)
+            entry = self.dedup.get(dedup_key)
+        if entry is not None:
+            # 直近の同一報告：Keepa は引き直さず、前回の結果を使い回す
+            entry.reporters.add(b.user_id)
+            res.apply_keepa(entry.keepa)
+            res.dup_count = entry.count
+            log.info(f"[bundle] dedup hit key={dedup_key} reporters={entry.count}")
+        else:
+            if two_phase:
+                # 2段階返信：手元で抜けた ID/価格/店舗で即返信 → Keepa が返ったら同じメッセージを編集
+                ack = await self._reply_bundle(b.messages[-1], res.reply_text(pending="⏳ 確認中…"), t_flush)
             try:
-                keepa = await asyncio.to_thread(fetch_product_from_keepa, asin, self.keepa_key, jan)
-                title = keepa.get("title")
-                amazon_price = keepa.get("amazon_price")
-                asin = asin or keepa.get("asin")
+                keepa = await asyncio.to_thread(
+                    fetch_product_from_keepa, res.asin, self.keepa_key, res.jan, history=keepa_history.enabled()
+                )
+                res.apply_keepa(keepa)
             except Exception as e:
-                log.exception(f"Keepa fetch failed (bundle) for ASIN={asin} JAN={jan}: {e}")
+                log.exception(f"Keepa fetch failed (bundle) for ASIN={res.asin} JAN={res.jan}: {e}")
 
-        if not (asin or jan):
-            log.info(f"[bundle] skip: no ASIN/JAN found (price={price_candidate})")
-            return
         # 返信（最優先：Sheetsが遅くても先に返す）
-        lines = ["🧾 **ナギサが調べたよ！**"]
-        if title: lines.append(f"・商品名：{title}")
-        if asin: lines.append(f"・ASIN：`{asin}`")
-        if jan: lines.append(f"・JAN：`{jan}`")
-        lines.append(f"・Amazon参考価格：{'—' if amazon_price is None else f'¥{amazon_price:,}'}")
-        if price_candidate: lines.append(f"・仕入れ値（候補）：¥{price_candidate:,}")
-        if store_chain: lines.append(f"・店舗：{store_chain}" + (f"（{store_branch}）" if store_branch else ""))
-
-        reply = "\n".join(lines)
+        if ack is not None:
+            try:
+                await ack.edit(content=res.reply_text())
+            except Exception as e:
+                log.warning(f"edit failed (bundle): {e}")
+        else:
+            await self._reply_bundle(b.messages[-1], res.reply_text(), t_flush)
+
+        if entry is not None:
+            # 重複は行を増やさず、最初の行の報告人数だけ更新
+            await self._sheets_task(b.channel_id, lambda: self._update_report_count(entry))
+            return
+        if dedup_key is not None and keepa is not None:
+            entry = DedupEntry(keepa=keepa, reporters={b.user_id})
+            self.dedup.put(dedup_key, entry)
+
+        # Sheets 書き込みはバックグラウンドで実行（ボットを止めない）
+        payload = res.sheet_payload(job)
+        await self._sheets_task(b.channel_id, lambda: self._append_to_sheets(payload, entry))
+        if self.product_index is not None:
+            asyncio.create_task(asyncio.to_thread(self.product_index.append, payload))
+
+    async def _add_barcode_jans(self, b: Bundle, job: BundleJob):
+        """文字で ID が書かれていない束だけ、添付画像のバーコードを読んで JAN 行として足す"""
+        ids = extract_ids("\n".join(job.texts))
+        if ids["asin"] or ids["jan"]:
+            return
+        attachments = [a for m in b.messages for a in (getattr(m, "attachments", None) or [])]
+        if not attachments:
+            return
+        t0 = time.time()
+        jans = await self.barcode.jans_from_attachments(attachments)
+        log.info(f"[barcode] {len(attachments)} attachments -> {jans} in {time.time()-t0:.2f}s")
+        if jans:
+            job.texts.append(f"JAN: {jans[0]}")
+
+    async def _sheets_task(self, channel_id: int, factory):
+        """Sheets 系の仕事を裏で走らせる。受付制御があれば sheets 段に積む（満杯なら空くまで待つ＝束の処理を遅らせる）"""
+        if self.admission is None:
+            asyncio.create_task(factory())
+        elif not await self.admission.submit_wait("sheets", channel_id, factory):
+            log.error("[admission] sheets queue stayed full; dropped a write")
+
+    async def _reply_bundle(self, target: discord.Message, text: str, t_flush: float) -> Optional[discord.Message]:
         try:
-            await b.messages[-1].reply(reply, mention_author=False)
+            sent = await target.reply(text, mention_author=False)
+            startup.first_reply("bundle", time.time() - t_flush)
+            return sent
         except Exception as e:
             log.warning(f"reply failed (bundle): {e}")
+            return None
 
-        # Sheets 書き込みはバックグラウンドで実行（ボットを止めない）
-        payload = {
-            "asin": asin,
-            "jan": jan,
-            "title": title,
-            "amazon_price": amazon_price,
-            "store_chain": store_chain,
-            "store_branch": store_branch,
-            "buy_price": price_candidate,
-            "user": f"{b.messages[0].author.name}#{b.messages[0].author.discriminator}",
-            "channel": channel_obj.name if channel_obj else "",
-        }
-        asyncio.create_task(self._append_to_sheets(payload))
-
-    async def _append_to_sheets(self, payload: dict):
+    async def _drain_outbox(self, poll_sec: float = 0.5):
+        """ゲートウェイモード：ワーカーが積んだ返信を Discord に流す"""
+        q = self.work_queue
+        while True:
+            try:
+                rows = await asyncio.to_thread(q.pending_replies)
+                for reply_id, channel_id, reply_to, edit_id, content in rows:
+                    ch = self.get_channel(channel_id)
+                    try:
+                        if ch is None:
+                            log.warning(f"[gateway] channel {channel_id} not found; drop reply {reply_id}")
+                        elif edit_id:
+                            # 2段階返信：先に出した「順番待ち」返信を書き換える
+                            await ch.get_partial_message(edit_id).edit(content=content)
+                        elif reply_to:
+                            await ch.get_partial_message(reply_to).reply(content, mention_author=False)
+                        else:
+                            await ch.send(content)
+                    except Exception as e:
+                        log.warning(f"[gateway] reply {reply_id} failed: {e}")
+                    await asyncio.to_thread(q.mark_reply_sent, reply_id)
+                if not rows:
+                    await asyncio.sleep(poll_sec)
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                log.exception(f"[gateway] outbox drain failed: {e}")
+                await asyncio.sleep(poll_sec * 4)
+
+    async def _append_to_sheets(self, payload: dict, entry: Optional[DedupEntry] = None):
         """Sheets への書き込みをイベントループから切り離して実行。失敗はログのみ。"""
         if os.getenv("NAGISA_DISABLE_SHEETS") == "1":
             log.info("[bundle] sheets disabled; skip append")
             return
         try:
             t0 = time.time()
-            await asyncio.wait_for(asyncio.to_thread(append_product, payload), timeout=12)
+            ref = await asyncio.wait_for(asyncio.to_thread(append_product, payload), timeout=12)
             log.info(f"[bundle] sheets appended in {time.time()-t0:.2f}s")
+            if entry is not None:
+                entry.sheet_ref = ref
+                # 追記が終わる前に重複報告が来ていたら、ここで人数を反映
+                if entry.count > 1:
+                    await self._update_report_count(entry)
         except asyncio.TimeoutError:
             log.warning("[bundle] Sheets append timed out (background)")
         except Exception as e:
             log.exception(f"[bundle] append_product failed (background): {e}")
+
+    async def _update_report_count(self, entry: DedupEntry):
+        """重複報告の人数を元の行へ反映。行番号がまだ無ければ追記完了時に反映される"""
+        if os.getenv("NAGISA_DISABLE_SHEETS") == "1" or entry.sheet_ref is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.to_thread(update_report_count, entry.sheet_ref, entry.count), timeout=12)
+        except Exception as e:
+            log.warning(f"[bundle] report_count update failed: {e}")
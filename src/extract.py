@@ -46,6 +46,18 @@ def normalize_store_by_channel(channel_name: str, channel_map: dict) -> Optional
                 return brand
     return None
 
+def build_channel_index(channel_map: dict) -> Dict[str, str]:
+    """channel_map を「小文字チャンネル名 → store_chain」の辞書に畳む（先勝ちで normalize_store_by_channel と同順）"""
+    index: Dict[str, str] = {}
+    for category, mapping in (channel_map or {}).items():
+        for key, brand in mapping.items():
+            index.setdefault(key.lower(), brand)
+    return index
+
+def lookup_store_by_channel(channel_name: str, channel_index: Dict[str, str]) -> Optional[str]:
+    """build_channel_index 済みの索引で O(1) 引き"""
+    return channel_index.get((channel_name or "").lower())
+
 STORE_SYNONYMS = {
     "ヤマダデンキ": ["ヤマダ", "YAMADA", "テックランド", "LABI", "ヤマダ電機"],
     "ビックカメラ・コジマ": ["ビック", "コジマ", "ビックカメラ", "ビック・コジマ"],
@@ -60,21 +72,33 @@ STORE_SYNONYMS = {
     "サンドラッグ": ["サンドラッグ", "サンドラ"]
 }
 
-def extract_store_from_comment(text: str) -> Tuple[Optional[str], Optional[str]]:
+StoreIndex = Tuple[Tuple[str, str], ...]
+
+def build_store_index(synonyms: Dict[str, list]) -> StoreIndex:
+    """STORE_SYNONYMS を (小文字の別名, 正規名) の並びに展開。走査順は元の辞書順のまま。"""
+    return tuple((s.lower(), norm) for norm, names in synonyms.items() for s in names)
+
+# 差し替えは参照の代入1回（hot_config から set_store_index で入れ替わる）
+_STORE_INDEX: StoreIndex = build_store_index(STORE_SYNONYMS)
+
+def set_store_index(index: StoreIndex):
+    global _STORE_INDEX
+    _STORE_INDEX = index
+
+def extract_store_from_comment(text: str, store_index: Optional[StoreIndex] = None) -> Tuple[Optional[str], Optional[str]]:
     """
     コメントからチェーンと支店名っぽいものを抽出。
     例：「ヤマダです。テック川崎で10個」→ ("ヤマダデンキ", "テック川崎")
+    store_index を渡さなければ現在の _STORE_INDEX を使う。
     """
     if not text:
         return None, None
 
     chain = None
-    for norm, synonyms in STORE_SYNONYMS.items():
-        for s in synonyms:
-            if s.lower() in text.lower():
-                chain = norm
-                break
-        if chain:
+    lowered = text.lower()
+    for s, norm in (store_index if store_index is not None else _STORE_INDEX):
+        if s in lowered:
+            chain = norm
             break
 
     # 支店名: 「◯◯店」「◯◯センター」「テック◯◯」などを軽く拾う
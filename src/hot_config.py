@@ -0,0 +1,128 @@
+# src/hot_config.py
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from . import extract, persona
+from .config import channel_map_path, store_synonyms_path, load_channel_map
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    再読み込み可能な設定の一式（不変）。
+    派生した索引まで組み立て終わってから current を差し替えるので、
+    抽出側は常に「完成した版」だけを見る。
+    """
+    channel_map: dict
+    channel_index: Dict[str, str]
+    store_index: extract.StoreIndex
+    salon: str
+    prompts: Tuple[str, str]
+    version: int = 0
+    loaded_at: float = field(default_factory=time.time)
+
+
+_current: Optional[ConfigSnapshot] = None
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _load_synonyms() -> dict:
+    path = store_synonyms_path()
+    if _mtime(path) is None:
+        return extract.STORE_SYNONYMS
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_snapshot(channel_map: Optional[dict] = None, *, version: int = 0) -> ConfigSnapshot:
+    """ファイルを読んで索引まで作る（ブロッキング。ループ外＝to_thread で呼ぶ）"""
+    if channel_map is None:
+        channel_map = load_channel_map()
+    salon = persona._load_salon_memory()
+    return ConfigSnapshot(
+        channel_map=channel_map,
+        channel_index=extract.build_channel_index(channel_map),
+        store_index=extract.build_store_index(_load_synonyms()),
+        salon=salon,
+        prompts=persona.build_prompts(salon),
+        version=version,
+    )
+
+
+def install(snap: ConfigSnapshot):
+    """組み立て済みスナップショットを一括で有効化（各所とも参照の代入のみ）"""
+    global _current
+    extract.set_store_index(snap.store_index)
+    persona.set_prompts(snap.prompts)
+    _current = snap
+
+
+def current() -> ConfigSnapshot:
+    if _current is None:
+        install(build_snapshot())
+    return _current
+
+
+class ConfigWatcher:
+    """channel_map.json / store_synonyms.json / サロンメモの mtime をポーリングし、変化したら裏で再構築して差し替える"""
+
+    def __init__(self, *, poll_sec: float = 5.0):
+        self.poll_sec = poll_sec
+        self._task: Optional[asyncio.Task] = None
+        self._mtimes = self._stat_all()
+
+    @staticmethod
+    def _paths():
+        return (channel_map_path(), store_synonyms_path(), persona.salon_memory_path())
+
+    def _stat_all(self):
+        return tuple(_mtime(p) for p in self._paths())
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        log.info(f"[hotcfg] watching {', '.join(self._paths())} every {self.poll_sec}s")
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def reload(self) -> ConfigSnapshot:
+        prev = current()
+        snap = await asyncio.to_thread(build_snapshot, version=prev.version + 1)
+        install(snap)
+        log.info(
+            f"[hotcfg] reloaded v{snap.version}: channels={len(snap.channel_index)} "
+            f"synonyms={len(snap.store_index)} salon={len(snap.salon)}chars"
+        )
+        return snap
+
+    async def _run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.poll_sec)
+                mt = await asyncio.to_thread(self._stat_all)
+                if mt == self._mtimes:
+                    continue
+                self._mtimes = mt
+                try:
+                    await self.reload()
+                except Exception as e:
+                    # 書きかけ/壊れた JSON などは旧版のまま継続（次の変更で再挑戦）
+                    log.warning(f"[hotcfg] reload failed, keeping v{current().version}: {e}")
+        except asyncio.CancelledError:
+            return
@@ -1,8 +1,29 @@
 # src/keepa_client.py
-import requests
+import os
+import threading
 from typing import Optional, Dict, Any
 
 KEEPA_ENDPOINT = "https://api.keepa.com/product"
+KEEPA_TOKEN_ENDPOINT = "https://api.keepa.com/token"
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Keepa 用の requests.Session（接続を使い回して TLS ハンドシェイクを毎回払わない）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests  # 初回利用時に import
+                _session = requests.Session()
+    return _session
+
+def prewarm(api_key: str):
+    """token エンドポイント（トークン消費なし）を叩いて接続を温めておく"""
+    r = get_session().get(KEEPA_TOKEN_ENDPOINT, params={"key": api_key}, timeout=10)
+    r.raise_for_status()
+    return r.json().get("tokensLeft")
 
 def _clean_price(value: Optional[int], *, domain: int = 5) -> Optional[int]:
     """
@@ -53,36 +74,8 @@ def _pick_last_valid_int(seq: Any) -> Optional[int]:
         return seq
     return None
 
-def fetch_product_from_keepa(asin: Optional[str],api_key: str,jan: Optional[str] = None) -> Dict[str, Optional[str]]:
-    """
-    Keepaから商品名と参考価格を取得。
-    - asin が無ければ jan(EAN/JAN) で検索（param: code）
-    - 価格は amazon→buyBox→new の順にフォールバック
-    - 無効値(-1/0)は None で返す
-    """
-    params = {
-        "key": api_key,
-        "domain": 5,   # Amazon.co.jp
-        "stats": 1,
-        "history": 0,
-    }
-    if asin:
-        params["asin"] = asin
-    elif jan:
-        params["code"] = jan   # EAN/JAN/UPC
-    else:
-        raise ValueError("asin or jan is required")
-
-    r = requests.get(KEEPA_ENDPOINT, params=params, timeout=15)
-    r.raise_for_status()
-    data = r.json()
-    if not data.get("products"):
-        return {"title": None, "amazon_price": None, "asin": asin}
-
-    p = data["products"][0]
-    title = p.get("title")
-    asin_from_keepa = p.get("asin") or asin
-
+def _pick_current_price(p: dict) -> Optional[int]:
+    """product から参考価格を1つ選ぶ（amazon→buyBox→new の順にフォールバック）"""
     stats = p.get("stats") or {}
     current = stats.get("current")
 
@@ -103,5 +96,73 @@ def fetch_product_from_keepa(asin: Optional[str],api_key: str,jan: Optional[str]
               or _last_valid_int(stats.get("buyBoxPrice")) \
               or _last_valid_int((p.get("data") or {}).get("BUY_BOX_SHIPPING"))
 
-    price = _clean_price(raw, domain=5)
-    return {"title": title, "amazon_price": price, "asin": asin_from_keepa}
+    return _clean_price(raw, domain=5)
+
+def _build_params(asin: Optional[str], api_key: str, jan: Optional[str], *, history: bool = False) -> dict:
+    params = {
+        "key": api_key,
+        "domain": 5,   # Amazon.co.jp
+        "stats": 1,    # current を得るのに必要な最小の集計期間（1日）
+        "history": 1 if history else 0,
+    }
+    if history:
+        params["days"] = 90
+    if asin:
+        params["asin"] = asin
+    elif jan:
+        params["code"] = jan   # EAN/JAN/UPC
+    else:
+        raise ValueError("asin or jan is required")
+    return params
+
+def lean_enabled() -> bool:
+    return os.getenv("NAGISA_KEEPA_LEAN") == "1"
+
+def parse_product_lean(body: bytes, asin: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    orjson でバイト列から直接パースし、返信に要る3項目だけを取り出す。
+    元の dict は関数を抜けた時点で捨てるので、大きな product を保持し続けない。
+    """
+    import orjson
+    data = orjson.loads(body)
+    products = data.get("products")
+    if not products:
+        return {"title": None, "amazon_price": None, "asin": asin}
+    p = products[0]
+    return {"title": p.get("title"), "amazon_price": _pick_current_price(p), "asin": p.get("asin") or asin}
+
+def fetch_product_from_keepa(asin: Optional[str],api_key: str,jan: Optional[str] = None, *, history: bool = False) -> Dict[str, Optional[str]]:
+    """
+    Keepaから商品名と参考価格を取得。
+    - asin が無ければ jan(EAN/JAN) で検索（param: code）
+    - 価格は amazon→buyBox→new の順にフォールバック
+    - 無効値(-1/0)は None で返す
+    - history=True なら90日分の価格履歴を NumPy 配列で "history" に添付（ASIN/JAN 単位でキャッシュ）
+    - NAGISA_KEEPA_LEAN=1（かつ history なし）なら orjson で必要項目だけ抜く軽量パス
+    """
+    if history:
+        from . import keepa_history
+        cached = keepa_history.cache.get(asin) or keepa_history.cache.get(f"jan:{jan}" if jan else None)
+        if cached is not None:
+            return cached
+    params = _build_params(asin, api_key, jan, history=history)
+
+    r = get_session().get(KEEPA_ENDPOINT, params=params, timeout=15)
+    r.raise_for_status()
+    if not history and lean_enabled():
+        return parse_product_lean(r.content, asin)
+    data = r.json()
+    if not data.get("products"):
+        return {"title": None, "amazon_price": None, "asin": asin}
+
+    p = data["products"][0]
+    title = p.get("title")
+    asin_from_keepa = p.get("asin") or asin
+    price = _pick_current_price(p)
+    result = {"title": title, "amazon_price": price, "asin": asin_from_keepa}
+    if history:
+        result["history"] = keepa_history.decode_product_history(p)
+        keepa_history.cache.put(asin_from_keepa, result)
+        if jan:
+            keepa_history.cache.put(f"jan:{jan}", result)
+    return result
@@ -0,0 +1,197 @@
+# src/keepa_history.py
+"""
+Keepa の価格履歴（csv 配列）を NumPy 配列に展開して、30/90日の統計と想定粗利をまとめて計算する。
+- csv[i] は [keepa分, 価格, keepa分, 価格, ...] の交互配列（BUY_BOX_SHIPPING だけ [分, 価格, 送料] の3つ組）
+- keepa分 = 2011-01-01 からの経過分。価格 -1 は「在庫なし/価格なし」
+NumPy が無い環境では available() が False になり、履歴モードは自動で無効。
+NumPy 自体は起動を重くしないよう、初回の計算時に import する。
+"""
+import importlib.util
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+
+log = logging.getLogger(__name__)
+
+KEEPA_EPOCH_MIN = 21564000  # keepa分 + これ = UNIX分
+CSV_AMAZON = 0
+CSV_NEW = 1
+CSV_BUY_BOX_SHIPPING = 18
+WINDOWS_DAYS = (30, 90)
+
+
+_AVAILABLE = importlib.util.find_spec("numpy") is not None  # 任意依存
+
+
+def available() -> bool:
+    return _AVAILABLE
+
+
+def enabled() -> bool:
+    return os.getenv("NAGISA_KEEPA_HISTORY") == "1" and available()
+
+
+def keepa_minutes_now() -> int:
+    return int(time.time() // 60) - KEEPA_EPOCH_MIN
+
+
+@dataclass
+class PriceHistory:
+    """1系列ぶんの履歴（times: keepa分 int32 / prices: 円 int32, -1=無効）"""
+    source: str
+    times: Any
+    prices: Any
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.times.nbytes + self.prices.nbytes)
+
+
+def decode_series(raw: Optional[Sequence[int]], stride: int = 2):
+    """交互配列を (times, prices) の int32 配列へ。3つ組なら価格＋送料を合算。"""
+    import numpy as np
+    if not raw:
+        return None
+    a = np.asarray(raw, dtype=np.int64)
+    n = len(a) // stride
+    if n == 0:
+        return None
+    a = a[: n * stride].reshape(n, stride)
+    times = a[:, 0].astype(np.int32)
+    prices = a[:, 1]
+    if stride == 3:
+        ship = np.where(a[:, 2] > 0, a[:, 2], 0)
+        prices = np.where(prices > 0, prices + ship, -1)
+    return times, prices.astype(np.int32)
+
+
+def decode_product_history(product: dict) -> Optional[PriceHistory]:
+    """Amazon本体 → 新品 → カート の順に、有効値のある系列を1本選ぶ（従来の current と同じ優先順）"""
+    csv = product.get("csv") or []
+    for idx, stride, name in ((CSV_AMAZON, 2, "amazon"), (CSV_NEW, 2, "new"), (CSV_BUY_BOX_SHIPPING, 3, "buyBox")):
+        if len(csv) <= idx:
+            continue
+        dec = decode_series(csv[idx], stride)
+        if dec is None:
+            continue
+        times, prices = dec
+        if (prices > 0).any():
+            return PriceHistory(source=name, times=times, prices=prices)
+    return None
+
+
+def window_stats(hist: PriceHistory, now_min: Optional[int] = None, windows: Sequence[int] = WINDOWS_DAYS) -> Dict[str, Any]:
+    """
+    各ウィンドウの min/avg/max をまとめて計算（avg は滞在時間で重み付け）。
+    ウィンドウ × 点 の行列でブロードキャストするので Python ループは回さない。
+    """
+    import numpy as np
+    now_min = keepa_minutes_now() if now_min is None else now_min
+    t = hist.times.astype(np.int64)
+    p = hist.prices.astype(np.int64)
+    valid = p > 0
+    seg_end = np.append(t[1:], now_min)                                   # 各価格が続いた区間の終わり
+    starts = now_min - np.asarray(windows, dtype=np.int64)[:, None] * 1440  # (W, 1)
+    dur = np.clip(seg_end[None, :] - np.maximum(t[None, :], starts), 0, None) * valid[None, :]  # (W, N)
+    in_win = dur > 0
+    total = dur.sum(axis=1)
+    avg = np.where(total > 0, (dur * p[None, :]).sum(axis=1) / np.maximum(total, 1), np.nan)
+    big = np.iinfo(np.int64).max
+    mins = np.where(in_win, p[None, :], big).min(axis=1)
+    maxs = np.where(in_win, p[None, :], -1).max(axis=1)
+
+    last_valid = np.flatnonzero(valid)
+    current = int(p[last_valid[-1]]) if len(last_valid) else None
+    out: Dict[str, Any] = {"source": hist.source, "current": current}
+    for i, d in enumerate(windows):
+        if total[i] == 0:
+            out[f"{d}d"] = None
+            continue
+        out[f"{d}d"] = {"min": int(mins[i]), "avg": int(round(avg[i])), "max": int(maxs[i])}
+    ref = out.get(f"{windows[-1]}d")
+    if current and ref and ref["avg"]:
+        out["drop_pct"] = round((current - ref["avg"]) / ref["avg"] * 100, 1)
+    return out
+
+
+def margin_stats(stats: Dict[str, Any], buy_price: Optional[int], fee_rate: Optional[float] = None) -> Optional[Dict[str, int]]:
+    """現在/30日平均/90日平均 の各売価に対する想定粗利（手数料率控除後 − 仕入れ値）をベクトルで一括計算"""
+    import numpy as np
+    if not buy_price or not stats:
+        return None
+    fee_rate = float(os.getenv("NAGISA_AMAZON_FEE_RATE", "0.15")) if fee_rate is None else fee_rate
+    labels, sells = [], []
+    if stats.get("current"):
+        labels.append("current"); sells.append(stats["current"])
+    for d in WINDOWS_DAYS:
+        w = stats.get(f"{d}d")
+        if w:
+            labels.append(f"avg{d}"); sells.append(w["avg"])
+    if not sells:
+        return None
+    m = np.rint(np.asarray(sells, dtype=np.float64) * (1.0 - fee_rate) - buy_price).astype(np.int64)
+    return dict(zip(labels, (int(x) for x in m)))
+
+
+def format_lines(stats: Optional[Dict[str, Any]], margins: Optional[Dict[str, int]]) -> list:
+    """返信用の行（束の返信に後置する）"""
+    if not stats:
+        return []
+    lines = []
+    for d in WINDOWS_DAYS:
+        w = stats.get(f"{d}d")
+        if w:
+            lines.append(f"・{d}日：最安¥{w['min']:,} / 平均¥{w['avg']:,} / 最高¥{w['max']:,}")
+    if stats.get("drop_pct") is not None:
+        lines.append(f"・いまの価格は90日平均比 {stats['drop_pct']:+.1f}%")
+    if margins:
+        names = {"current": "現在", **{f"avg{d}": f"{d}日平均" for d in WINDOWS_DAYS}}
+        parts = [f"{names.get(k, k)}基準 ¥{v:,}" for k, v in margins.items()]
+        lines.append("・想定粗利（手数料控除・参考）：" + " / ".join(parts))
+    return lines
+
+
+class HistoryCache:
+    """ASIN → (取得時刻, Keepa結果 dict) の LRU＋TTL。to_thread 越しに触るのでロック付き"""
+
+    def __init__(self, max_items: int = 512, ttl_sec: float = 3600.0):
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        self._d: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Optional[str]) -> Optional[dict]:
+        if not key:
+            return None
+        with self._lock:
+            hit = self._d.get(key)
+            if hit is None:
+                return None
+            if time.time() - hit[0] > self.ttl_sec:
+                del self._d[key]
+                return None
+            self._d.move_to_end(key)
+            return hit[1]
+
+    def put(self, key: Optional[str], value: dict):
+        if not key:
+            return
+        with self._lock:
+            self._d[key] = (time.time(), value)
+            self._d.move_to_end(key)
+            while len(self._d) > self.max_items:
+                self._d.popitem(last=False)
+
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(v[1]["history"].nbytes for v in self._d.values() if v[1].get("history") is not None)
+
+
+cache = HistoryCache(
+    max_items=int(os.getenv("NAGISA_KEEPA_HISTORY_CACHE", "512")),
+    ttl_sec=float(os.getenv("NAGISA_KEEPA_HISTORY_TTL_SEC", "3600")),
+)
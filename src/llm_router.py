@@ -0,0 +1,216 @@
+# src/llm_router.py
+"""
+LLM 呼び出しのルーティングとヘッジ（NAGISA_LLM_ROUTER=1 のときだけ使う）。
+- 経路（route）ごとにモデル・全体の持ち時間（budget）を決める
+    mention : メンション返信。短い発言は最速モデルへ
+    digest  : 商材まとめの一言
+    report  : 日報（長文なので持ち時間も長い）
+- 1本目が「その経路の最近の p95」を過ぎても返らなければ、2本目（ヘッジ）を投げる。
+  先に返った方を採用し、負けた方はキャンセル（AsyncOpenAI なので HTTP ごと切れる）
+- 1本目がすぐ失敗した場合は待たずに2本目を投げる（従来の直列リトライの代わり。ヘッジではなく retries に数える）
+
+環境変数:
+  NAGISA_LLM_FAST_MODEL=gpt-4o-mini        短いメンション用
+  NAGISA_LLM_MENTION_MODEL=gpt-4o-mini     長めのメンション用
+  NAGISA_LLM_HEDGE_MODEL=                  ヘッジに使うモデル（空なら1本目と同じ）
+  NAGISA_LLM_SHORT_CHARS=120               最後の user メッセージ（指示文込み）がこれ以下なら「短いメンション」
+  NAGISA_LLM_BUDGET_MENTION=8 / _DIGEST=20 / _REPORT=120   経路ごとの持ち時間（秒）
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .utils import percentiles
+
+log = logging.getLogger(__name__)
+
+
+def enabled() -> bool:
+    return os.getenv("NAGISA_LLM_ROUTER") == "1"
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str
+    model: str
+    budget_sec: float
+    hedge_default_sec: float   # 計測がたまるまでのヘッジ開始時刻
+    fast_model: Optional[str] = None
+    short_chars: int = 0
+
+
+def _routes() -> Dict[str, Route]:
+    fast = os.getenv("NAGISA_LLM_FAST_MODEL", "gpt-4o-mini")
+    return {
+        "mention": Route(
+            "mention",
+            model=os.getenv("NAGISA_LLM_MENTION_MODEL", "gpt-4o-mini"),
+            budget_sec=float(os.getenv("NAGISA_LLM_BUDGET_MENTION", "8")),
+            hedge_default_sec=2.5,
+            fast_model=fast,
+            short_chars=int(os.getenv("NAGISA_LLM_SHORT_CHARS", "120")),
+        ),
+        "digest": Route(
+            "digest",
+            model=fast,
+            budget_sec=float(os.getenv("NAGISA_LLM_BUDGET_DIGEST", "20")),
+            hedge_default_sec=5.0,
+        ),
+        "report": Route(
+            "report",
+            model=os.getenv("NAGISA_MODEL_DAILY", "gpt-4o"),
+            budget_sec=float(os.getenv("NAGISA_LLM_BUDGET_REPORT", "120")),
+            hedge_default_sec=40.0,
+        ),
+    }
+
+
+class LatencyTracker:
+    """
+    経路ごとの直近の所要時間。
+    - _req : 1リクエスト単体の所要時間（勝った方の、投げてから返るまで）。ヘッジ開始時刻はこの p95
+    - _lat : 呼び出し全体（ヘッジ込み）の所要時間。!health の表示用
+    ヘッジ込みの時間で p95 を取ると、ヘッジするほど開始時刻が遅れていくので分けて持つ。
+    """
+
+    def __init__(self, maxlen: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._lat: Dict[str, Deque[float]] = {}
+        self._req: Dict[str, Deque[float]] = {}
+        self.calls: Dict[str, int] = {}
+        self.hedges: Dict[str, int] = {}
+        self.hedge_wins: Dict[str, int] = {}
+        self.retries: Dict[str, int] = {}
+        self.timeouts: Dict[str, int] = {}
+        self._maxlen = maxlen
+
+    def observe(self, route: str, took: float, request_took: Optional[float] = None):
+        self._lat.setdefault(route, deque(maxlen=self._maxlen)).append(took)
+        if request_took is not None:
+            self._req.setdefault(route, deque(maxlen=self._maxlen)).append(request_took)
+
+    def hedge_after(self, r: Route) -> float:
+        lat = self._req.get(r.name)
+        base = r.hedge_default_sec
+        if lat and len(lat) >= self.min_samples:
+            base = percentiles(lat, qs=(95,))["p95"]
+        # 持ち時間の半分を超えてから投げても間に合わないので上限を置く
+        return max(0.2, min(base, r.budget_sec / 2))
+
+    def bump(self, d: Dict[str, int], route: str):
+        d[route] = d.get(route, 0) + 1
+
+    def stats(self) -> dict:
+        out = {}
+        for name, lat in self._lat.items():
+            p = percentiles(lat)
+            out[name] = {
+                "calls": self.calls.get(name, 0),
+                "hedged": self.hedges.get(name, 0),
+                "hedge_wins": self.hedge_wins.get(name, 0),
+                "retries": self.retries.get(name, 0),
+                "timeouts": self.timeouts.get(name, 0),
+                **{k: round(v, 2) for k, v in p.items()},
+            }
+        return out
+
+
+tracker = LatencyTracker()
+
+_async_client = None
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        # リトライはここで（ヘッジで）やるので SDK 側は0回に
+        _async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return _async_client
+
+
+def pick_model(r: Route, messages: List[dict]) -> str:
+    if r.fast_model and r.short_chars:
+        last = (messages[-1].get("content") or "") if messages else ""
+        if len(last) <= r.short_chars:
+            return r.fast_model
+    return r.model
+
+
+async def _create(model: str, messages: List[dict], max_tokens: int, temperature: float, timeout: float):
+    return await get_async_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout,
+    )
+
+
+async def routed_chat(
+    route: str, messages: List[dict], *, max_tokens: int, temperature: float
+) -> Tuple[str, dict]:
+    """経路に従ってモデルを選び、必要ならヘッジして呼ぶ。戻り値は (本文, usage)"""
+    from .openai_client import _usage
+    r = _routes()[route]
+    primary = pick_model(r, messages)
+    hedge_model = os.getenv("NAGISA_LLM_HEDGE_MODEL") or primary
+    t0 = time.time()
+    deadline = t0 + r.budget_sec
+    tracker.bump(tracker.calls, route)
+
+    models: Dict[asyncio.Task, str] = {}
+    started: Dict[asyncio.Task, float] = {}
+
+    def _start(model: str) -> asyncio.Task:
+        remaining = max(0.5, deadline - time.time())
+        t = asyncio.create_task(_create(model, messages, max_tokens, temperature, remaining))
+        models[t] = model
+        started[t] = time.time()
+        return t
+
+    first = _start(primary)
+    tasks = {first}
+    hedged = False
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=tracker.hedge_after(r))
+        if not done:
+            # 1本目がまだ走っている間に2本目を投げたときだけヘッジと数える
+            hedged = True
+            tracker.bump(tracker.hedges, route)
+            tasks.add(_start(hedge_model))
+        elif first.exception() is not None:
+            log.warning(f"[llm] {route} primary failed fast: {first.exception()!r}")
+            tasks.discard(first)
+            tracker.bump(tracker.retries, route)
+            tasks.add(_start(hedge_model))
+        last_err: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.time()), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for t in done:
+                if t.exception() is None:
+                    now = time.time()
+                    took = now - t0
+                    tracker.observe(route, took, now - started[t])
+                    if hedged and t is not first:
+                        tracker.bump(tracker.hedge_wins, route)
+                    log.info(f"[llm] route={route} model={models[t]} hedged={hedged} took={took:.2f}s")
+                    resp = t.result()
+                    usage = _usage(resp, took)
+                    usage["model"] = models[t]
+                    return resp.choices[0].message.content.strip(), usage
+                last_err = t.exception()
+        if last_err is not None and not tasks:
+            raise last_err
+        tracker.bump(tracker.timeouts, route)
+        tracker.observe(route, time.time() - t0)
+        raise asyncio.TimeoutError(f"llm route={route} exceeded budget {r.budget_sec}s")
+    finally:
+        for t in tasks:
+            t.cancel()  # 負けた方／持ち時間切れの残りは HTTP ごと打ち切る
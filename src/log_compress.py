@@ -0,0 +1,150 @@
+# src/log_compress.py
+"""
+日報に送る前の投稿ログの「ほぼ同じ行」まとめ（REPORT_COMPRESS=1）。
+- 「在庫ありました」の連投、地域チャンネルへの同じ告知の貼り回し、スタンプだけの返信…を1行に畳む
+- 本文（発言者・チャンネルを除いた部分）を正規化 → 文字3-gram → MinHash 署名 → LSH（バンド分割）で候補を出し、
+  署名の一致率が閾値以上の組をまとめる（Union-Find）
+- 代表は最初の発言。末尾に「〔×件数 / 人数 / チャンネル一覧〕」を付けて、"6チャンネルで告知" のような横断の強さは残す
+- 要 numpy（無ければ何もせず元の行を返す）
+"""
+import importlib.util
+import logging
+import re
+import unicodedata
+import zlib
+from typing import List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+LINE_RE = re.compile(r"^\[#(?P<ch>[^\]]+)\] (?P<who>[^:]*): (?P<body>.*)$")
+URL_RE = re.compile(r"https?://\S+")
+_PRIME = (1 << 61) - 1
+_AVAILABLE = importlib.util.find_spec("numpy") is not None  # 任意依存
+
+
+def available() -> bool:
+    return _AVAILABLE
+
+
+def _norm(body: str) -> str:
+    """全角/半角・大小文字・空白・記号の揺れを消す（URL はクエリ違いで割れないようドメインだけ残す）"""
+    t = URL_RE.sub(lambda m: m.group(0).split("/")[2] if m.group(0).count("/") >= 2 else "", body)
+    t = unicodedata.normalize("NFKC", t).lower()
+    return "".join(c for c in t if c.isalnum() or ord(c) > 0x2FFF)
+
+
+def _shingles(text: str, k: int = 3) -> List[int]:
+    if len(text) <= k:
+        return [zlib.crc32(text.encode("utf-8"))]
+    return list({zlib.crc32(text[i:i + k].encode("utf-8")) for i in range(len(text) - k + 1)})
+
+
+def _signatures(shingle_sets: List[List[int]], num_perm: int, seed: int = 1):
+    """MinHash 署名（行×num_perm）。ハッシュ族は (a*x + b) mod p"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+    sig = np.empty((len(shingle_sets), num_perm), dtype=np.uint64)
+    for i, sh in enumerate(shingle_sets):
+        x = np.asarray(sh, dtype=np.uint64)[:, None]
+        # uint64 の掛け算は桁あふれで mod 2^64 になるが、ハッシュとしては十分ばらける
+        sig[i] = ((x * a + b) % _PRIME).min(axis=0)
+    return sig
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            # 小さい番号（＝先に出た行）を代表にする
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+def cluster(bodies: List[str], *, threshold: float = 0.6, num_perm: int = 64, bands: int = 16) -> List[int]:
+    """各行の代表行インデックスを返す（自分が代表なら自分）"""
+    import numpy as np
+
+    n = len(bodies)
+    uf = _UnionFind(n)
+    normed = [_norm(b) for b in bodies]
+    # 正規化後が完全に同じ行は署名を取るまでもない
+    first_seen = {}
+    for i, t in enumerate(normed):
+        if t in first_seen:
+            uf.union(first_seen[t], i)
+        else:
+            first_seen[t] = i
+    uniq = sorted(first_seen.values())
+    uniq = [i for i in uniq if normed[i]]  # 正規化で空になる行（記号だけ）は完全一致のみ
+    if len(uniq) > 1:
+        sig = _signatures([_shingles(normed[i]) for i in uniq], num_perm)
+        rows = num_perm // bands
+        for band in range(bands):
+            buckets = {}
+            chunk = sig[:, band * rows:(band + 1) * rows]
+            for pos in range(len(uniq)):
+                buckets.setdefault(chunk[pos].tobytes(), []).append(pos)
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                # 同じバケットの組だけ署名を突き合わせる（大きいバケットは先頭との比較に留める）
+                pairs = (
+                    [(p, q) for k, p in enumerate(members) for q in members[k + 1:]]
+                    if len(members) <= 20 else [(members[0], q) for q in members[1:]]
+                )
+                for p, q in pairs:
+                    a, b = uniq[p], uniq[q]
+                    if uf.find(a) == uf.find(b):
+                        continue
+                    if float(np.mean(sig[p] == sig[q])) >= threshold:
+                        uf.union(a, b)
+    return [uf.find(i) for i in range(n)]
+
+
+def _parse(line: str) -> Tuple[Optional[str], Optional[str], str]:
+    m = LINE_RE.match(line)
+    if not m:
+        return None, None, line
+    return m.group("ch"), m.group("who"), m.group("body")
+
+
+def compress_lines(lines: List[str], *, threshold: float = 0.6, max_channels: int = 6) -> List[str]:
+    """ほぼ同じ行を代表1行に畳む。順番は代表（最初の発言）の位置のまま"""
+    if len(lines) < 2:
+        return list(lines)
+    if not available():
+        log.warning("[report] compress needs numpy -> skip")
+        return list(lines)
+    parsed = [_parse(ln) for ln in lines]
+    roots = cluster([p[2] for p in parsed], threshold=threshold)
+    groups = {}
+    for i, r in enumerate(roots):
+        groups.setdefault(r, []).append(i)
+    out = []
+    for i, line in enumerate(lines):
+        if roots[i] != i:
+            continue
+        members = groups[i]
+        if len(members) == 1:
+            out.append(line)
+            continue
+        chans = []
+        for j in members:
+            ch = parsed[j][0]
+            if ch and ch not in chans:
+                chans.append(ch)
+        people = len({parsed[j][1] for j in members})
+        ch_text = ", ".join(f"#{c}" for c in chans[:max_channels]) + (f" 他{len(chans) - max_channels}" if len(chans) > max_channels else "")
+        out.append(f"{line} 〔×{len(members)}件 / {people}人 / {len(chans)}ch: {ch_text}〕")
+    return out
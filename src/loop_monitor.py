@@ -0,0 +1,198 @@
+# src/loop_monitor.py
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from .utils import percentiles
+
+log = logging.getLogger(__name__)
+
+# スタック帰属で読み飛ばすフレーム（イベントループ自体の枠組み）
+_SKIP_PREFIXES = ("asyncio", "selectors", "threading", "concurrent")
+
+
+def _frame_label(frame) -> str:
+    mod = frame.f_globals.get("__name__", "?")
+    return f"{mod}:{frame.f_code.co_name}"
+
+
+def _attribute(frame) -> str:
+    """
+    ループスレッドのスタックから「誰が詰まらせているか」を module:function で返す。
+    - 一番内側のフレーム（実際に走っている場所）
+    - 自前コード（src.*）の一番内側のフレーム（呼び出し元）
+    両者が違えば "inner <- src.xxx:func" 形式でまとめる。
+    """
+    inner = None
+    ours = None
+    f = frame
+    while f is not None:
+        mod = f.f_globals.get("__name__", "") or ""
+        if inner is None and not mod.startswith(_SKIP_PREFIXES):
+            inner = _frame_label(f)
+        if ours is None and mod.startswith("src."):
+            ours = _frame_label(f)
+        if inner and ours:
+            break
+        f = f.f_back
+    inner = inner or _frame_label(frame)
+    if ours and ours != inner:
+        return f"{inner} <- {ours}"
+    return inner
+
+
+class LoopMonitor:
+    """
+    イベントループの健康診断。
+    - プローブ: interval ごとに sleep して、予定より何秒遅れて起きたか（スケジューリング遅延）を記録
+    - ウォッチドッグ: 別スレッドから心拍を監視し、slow_threshold 以上止まっていたら
+      ループスレッドのスタックをサンプリングして module:function に帰属
+    - ラベル: APScheduler のジョブ実行中はジョブ名でタグ付けし、平常時(idle)と比較できる
+    """
+
+    def __init__(self, *, interval: float = 0.5, slow_threshold: float = 0.25, window: int = 7200):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.samples: Deque[Tuple[float, float, str]] = deque(maxlen=window)  # (epoch, lag, label)
+        self.slow_counts: Counter = Counter()
+        self.slow_seconds: Counter = Counter()
+        self._slow_lock = threading.Lock()  # slow_* はウォッチドッグ thread が書き、ループ側が読む
+        self.max_lag = 0.0
+        self._active_jobs: Set[str] = set()
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "LoopMonitor":
+        return cls(
+            interval=float(os.getenv("NAGISA_LOOP_MONITOR_INTERVAL", "0.5")),
+            slow_threshold=float(os.getenv("NAGISA_LOOP_SLOW_SEC", "0.25")),
+        )
+
+    # ---- 起動/停止 ----
+    def start(self):
+        """ループスレッド上で呼ぶこと（プローブ task とウォッチドッグ thread を起動）"""
+        if self._task and not self._task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="nagisa-loop-watchdog", daemon=True)
+        self._watchdog.start()
+        log.info(f"[loopmon] started interval={self.interval}s slow>={self.slow_threshold}s")
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    # ---- スケジューラ連携 ----
+    def attach_scheduler(self, sched):
+        """APScheduler のジョブ開始/終了でラベルを切り替える（08:30/08:31 の影響を切り分ける用）"""
+        from apscheduler.events import (
+            EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED,
+        )
+
+        def _on_event(ev):
+            job = sched.get_job(ev.job_id)
+            name = job.name if job else str(ev.job_id)
+            if ev.code == EVENT_JOB_SUBMITTED:
+                self._active_jobs.add(name)
+            else:
+                self._active_jobs.discard(name)
+
+        sched.add_listener(
+            _on_event,
+            EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED,
+        )
+
+    def _label(self) -> str:
+        return "+".join(sorted(self._active_jobs)) if self._active_jobs else "idle"
+
+    # ---- 計測 ----
+    async def _probe(self):
+        try:
+            while True:
+                t0 = time.monotonic()
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                self._beat = now
+                lag = max(0.0, now - t0 - self.interval)
+                self.max_lag = max(self.max_lag, lag)
+                self.samples.append((time.time(), lag, self._label()))
+        except asyncio.CancelledError:
+            return
+
+    def _watch(self):
+        """別スレッド：心拍が止まっている間、ループスレッドのスタックを定期サンプリング"""
+        period = max(0.05, self.slow_threshold / 2)
+        while not self._stop.wait(period):
+            stalled = time.monotonic() - self._beat - self.interval
+            if stalled < self.slow_threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            where = _attribute(frame)
+            with self._slow_lock:
+                self.slow_counts[where] += 1
+                self.slow_seconds[where] += period
+
+    # ---- 公開 ----
+    def snapshot(self, since_sec: Optional[float] = None) -> Dict:
+        """遅延パーセンタイル（全体/ラベル別）と、詰まりの上位帰属先を返す"""
+        cutoff = time.time() - since_sec if since_sec else 0.0
+        by_label: Dict[str, list] = {}
+        lags = []
+        for ts, lag, label in list(self.samples):
+            if ts < cutoff:
+                continue
+            lags.append(lag)
+            by_label.setdefault(label, []).append(lag)
+        with self._slow_lock:
+            slow = [(k, n, round(self.slow_seconds[k], 2)) for k, n in self.slow_counts.most_common(5)]
+        return {
+            "samples": len(lags),
+            "lag": percentiles(lags),
+            "max_lag": self.max_lag,
+            "by_label": {k: {"n": len(v), **percentiles(v)} for k, v in by_label.items()},
+            "slow": slow,
+        }
+
+    def format_snapshot(self, since_sec: Optional[float] = None) -> str:
+        s = self.snapshot(since_sec)
+        ms = lambda v: f"{v * 1000:.0f}ms"
+        lines = [
+            "🩺 **イベントループの調子**",
+            f"・遅延 p50={ms(s['lag']['p50'])} p95={ms(s['lag']['p95'])} p99={ms(s['lag']['p99'])}"
+            f" max={ms(s['max_lag'])}（{s['samples']}サンプル）",
+        ]
+        for label, v in sorted(s["by_label"].items()):
+            lines.append(f"・[{label}] n={v['n']} p50={ms(v['p50'])} p95={ms(v['p95'])} p99={ms(v['p99'])}")
+        if s["slow"]:
+            lines.append("・詰まりの原因（上位）：")
+            for where, n, sec in s["slow"]:
+                lines.append(f"　- `{where}` ×{n}（約{sec}s）")
+        return "\n".join(lines)
+
+    async def log_periodically(self, every_sec: float):
+        """定期的にログへ要約を出す（直近 every_sec 秒分）"""
+        try:
+            while True:
+                await asyncio.sleep(every_sec)
+                s = self.snapshot(every_sec)
+                log.info(
+                    f"[loopmon] lag p50={s['lag']['p50']*1000:.0f}ms p95={s['lag']['p95']*1000:.0f}ms "
+                    f"p99={s['lag']['p99']*1000:.0f}ms labels={list(s['by_label'])} slow={s['slow'][:3]}"
+                )
+        except asyncio.CancelledError:
+            return
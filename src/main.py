@@ -1,7 +1,11 @@
+import time
+_T0 = time.perf_counter()  # import 時間の計測用（最初に置く）
+
 import logging
 import sys
 import discord
 
+from src import startup
 from src.config import load_settings
 from src.discord_bot import NagisaDiscordBot
 from src.digest_job import setup_scheduler
@@ -18,12 +22,15 @@ def setup_logging():
 
 def main():
     setup_logging()
+    startup.set_origin(_T0)
+    startup.mark("imports")
     st = load_settings()
 
     intents = discord.Intents.default()
     intents.message_content = True  # 重要：Discordの開発者ポータルで有効化も必要
 
     bot = NagisaDiscordBot(intents=intents, keepa_key=st.keepa_key, channel_map=st.channel_map)
+    startup.mark("bot_constructed")
 
     # スケジューラ起動
     #setup_scheduler(bot)  
@@ -1,16 +1,27 @@
 # src/openai_client.py
-import os, asyncio
-from openai import OpenAI
+import os, asyncio, time
+from . import llm_router
 
 _client = None
 def get_client():
     global _client
     if _client is None:
+        from openai import OpenAI  # 重いので初回利用時に import（起動を速くする）
         _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     return _client
 
-async def chat_simple(system: str, user: str, model: str = "gpt-4o-mini"):
-    """単発チャット: 非同期で叩けるようにexecutorで包む"""
+def prewarm(model: str = "gpt-4o-mini"):
+    """クライアント生成＋TLS/認証を先に済ませる（トークンを消費しない models.retrieve）"""
+    get_client().models.retrieve(model)
+
+async def chat_simple(system: str, user: str, model: str = "gpt-4o-mini", *, route: str = None):
+    """単発チャット: 非同期で叩けるようにexecutorで包む。
+    route を渡し NAGISA_LLM_ROUTER=1 なら llm_router 経由（モデル選択＋ヘッジ）"""
+    if route and llm_router.enabled():
+        text, _ = await llm_router.routed_chat(
+            route, [{"role":"system","content":system}, {"role":"user","content":user}], max_tokens=220, temperature=0.6
+        )
+        return text
     client = get_client()
     def _call():
         return client.chat.completions.create(
@@ -33,11 +44,17 @@ async def chat_simple(system: str, user: str, model: str = "gpt-4o-mini"):
     resp = await asyncio.to_thread(_call)
     return resp.choices[0].message.content.strip()
 
-async def chat_complete(system: str, user: str, *, model: str = None, max_tokens: int = 1200, temperature: float = 0.4):
+async def chat_complete(system: str, user: str, *, model: str = None, max_tokens: int = 1200, temperature: float = 0.4, route: str = None):
     """
     長文要約・日報向け。chat_simpleよりもmax_tokensを広く取りたいケースに使う。
     modelは .env の NAGISA_MODEL_DAILY を優先し、未指定なら gpt-4o。
     """
+    if route and llm_router.enabled():
+        text, _ = await llm_router.routed_chat(
+            route, [{"role":"system","content":system}, {"role":"user","content":user}],
+            max_tokens=max_tokens, temperature=temperature,
+        )
+        return text
     client = get_client()
     model = model or os.getenv("NAGISA_MODEL_DAILY", "gpt-4o")
     def _call():
@@ -57,3 +74,41 @@ async def chat_complete(system: str, user: str, *, model: str = None, max_tokens
             last_err = e
             await asyncio.sleep(0.8 * (i+1))
     raise last_err
+
+async def chat_messages(messages: list, *, model: str = "gpt-4o-mini", max_tokens: int = 220, temperature: float = 0.6, route: str = None):
+    """
+    会話履歴つきチャット。messages はそのまま渡す（先頭の system を毎回同じ文字列にすると
+    プロバイダ側のプロンプトキャッシュが効く）。戻り値は (本文, usage)。
+    usage = {"prompt_tokens", "cached_tokens", "completion_tokens", "latency"}
+    """
+    if route and llm_router.enabled():
+        return await llm_router.routed_chat(route, messages, max_tokens=max_tokens, temperature=temperature)
+    client = get_client()
+    def _call():
+        return client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=30,
+        )
+    last_err = None
+    for i in range(3):
+        try:
+            t0 = time.time()
+            resp = await asyncio.to_thread(_call)
+            return resp.choices[0].message.content.strip(), _usage(resp, time.time() - t0)
+        except Exception as e:
+            last_err = e
+            await asyncio.sleep(0.8 * (i+1))
+    raise last_err
+
+def _usage(resp, latency: float) -> dict:
+    u = getattr(resp, "usage", None)
+    details = getattr(u, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(u, "prompt_tokens", 0) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+        "completion_tokens": getattr(u, "completion_tokens", 0) or 0,
+        "latency": latency,
+    }
@@ -1,10 +1,13 @@
 import os
 
+def salon_memory_path() -> str:
+    return os.getenv("SALON_MEMORY_PATH", "src/salon_memory.md")
+
 def _load_salon_memory() -> str:
     """のっかりサロンの前提メモを外部ファイルから読む。
     例: SALON_MEMORY_PATH=src/salon_memory.md
     無ければ空文字で続行（コードは壊れない）。"""
-    path = os.getenv("SALON_MEMORY_PATH", "src/salon_memory.md")
+    path = salon_memory_path()
     try:
         with open(path, "r", encoding="utf-8") as f:
             return f.read().strip()
@@ -13,12 +16,13 @@ def _load_salon_memory() -> str:
 
 _SALON = _load_salon_memory()
 
-def _attach_salon(text: str) -> str:
+def _attach_salon(text: str, salon: str = None) -> str:
     """サロン前提をSystem Promptへ後置。ファイル未設定なら無害。"""
-    return text + (("\n\n# のっかりサロン前提\n" + _SALON) if _SALON else "")
+    salon = _SALON if salon is None else salon
+    return text + (("\n\n# のっかりサロン前提\n" + salon) if salon else "")
 
-# ① 会話用（従来どおりのナギサ口調）＋サロン前提
-SYSTEM_PROMPT = _attach_salon("""あなたは“ナギサBOT”。頼れる年下の女の子。
+# ① 会話用（従来どおりのナギサ口調）
+_CHAT_BASE = """あなたは“ナギサBOT”。頼れる年下の女の子。
 - お兄さま（owner_idsに一致するユーザー）だけを「お兄さま」と呼ぶ。
 - 他のメンバーは「みなさま」と呼ぶ（男女混在OK）。
 - 口調：明るい/可愛い/簡潔。絵文字は多用しすぎない（1〜2個）。
@@ -32,19 +36,39 @@ SYSTEM_PROMPT = _attach_salon("""あなたは“ナギサBOT”。頼れる年
 - 事実は断定しすぎず、“参考”と言い添える。
 - 10行以内＋必要なら箇条書きで端的に。
 - NG：あおり/暴言/誤情報の断定。
-""")
+"""
 
-# ② 日報/要約用（編集トーン）＋サロン前提
-REPORT_SYSTEM_PROMPT = _attach_salon("""
+# ② 日報/要約用（編集トーン）
+_REPORT_BASE = """
 あなたは『ナギサ日報』の編集アシスタント。のっかりサロン全体の動きを俯瞰し、実用的に要約する。
 [出力ポリシー]
 - 断定や煽りは避け、検証語（〜が共有/〜との報告）を使う。価格・在庫・還元は“変動前提”で。
 - 固有名詞（店舗/商品/チェーン）は保持。数字は丸めず明記。個人情報は載せない。
 - 構成：「主要トピック / 会話の流れ / トレンド・気づき / ナギサのひとこと（2文以内）」。
-""")
+"""
+
+# それぞれ＋サロン前提（起動時の値。ホットリロード後の最新は system_prompt() / report_system_prompt()）
+SYSTEM_PROMPT = _attach_salon(_CHAT_BASE)
+REPORT_SYSTEM_PROMPT = _attach_salon(_REPORT_BASE)
 
 # 互換エイリアス（既存コードの import を満たす）
 EDITOR_SYSTEM_PROMPT = REPORT_SYSTEM_PROMPT
 
+# 現在のプロンプト一式。set_salon で丸ごと差し替える（参照の代入1回なので読み手は半端な状態を見ない）
+_PROMPTS = (SYSTEM_PROMPT, REPORT_SYSTEM_PROMPT)
+
+def build_prompts(salon: str) -> tuple:
+    return (_attach_salon(_CHAT_BASE, salon), _attach_salon(_REPORT_BASE, salon))
+
+def set_prompts(prompts: tuple):
+    global _PROMPTS
+    _PROMPTS = prompts
+
+def system_prompt() -> str:
+    return _PROMPTS[0]
+
+def report_system_prompt() -> str:
+    return _PROMPTS[1]
+
 def role_address(user_id: int, owner_ids: set[int]) -> str:
     return "お兄さま" if user_id in owner_ids else "みなさま"
\ No newline at end of file
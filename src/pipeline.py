@@ -0,0 +1,135 @@
+# src/pipeline.py
+"""
+束（bundle）の処理本体。Discord オブジェクトに依存しない形にしてあるので、
+ボット内（同一プロセス）でも、ワーカープロセス（src.worker）でも同じ処理を通せる。
+"""
+import logging
+import time
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+from . import hot_config
+from .extract import (
+    extract_ids,
+    extract_price_candidate_from_text,
+    lookup_store_by_channel,
+    extract_store_from_comment,
+)
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class BundleJob:
+    """キューに載せられる形の束（JSON 化できる値だけ持つ）"""
+    texts: List[str]
+    channel_id: int
+    channel_name: str
+    user_id: int
+    user: str
+    reply_to: int
+    created_at: float = field(default_factory=time.time)
+    ack_id: Optional[int] = None   # 2段階返信で先に出した返信（ワーカーはこれを編集する）
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "BundleJob":
+        return cls(**d)
+
+
+@dataclass
+class BundleResult:
+    asin: Optional[str]
+    jan: Optional[str]
+    price_candidate: Optional[int]
+    store_chain: Optional[str]
+    store_branch: Optional[str]
+    title: Optional[str] = None
+    amazon_price: Optional[int] = None
+    history_stats: Optional[dict] = None
+    margins: Optional[dict] = None
+    dup_count: int = 0
+
+    @property
+    def has_id(self) -> bool:
+        return bool(self.asin or self.jan)
+
+    def apply_keepa(self, keepa: dict):
+        self.title = keepa.get("title")
+        self.amazon_price = keepa.get("amazon_price")
+        self.asin = self.asin or keepa.get("asin")
+        hist = keepa.get("history")
+        if hist is not None:
+            from . import keepa_history
+            self.history_stats = keepa_history.window_stats(hist)
+            self.margins = keepa_history.margin_stats(self.history_stats, self.price_candidate)
+
+    def reply_text(self, pending: Optional[str] = None) -> str:
+        """pending を渡すと Keepa 待ちの仮返信（Amazon参考価格の欄にその文言を出す）"""
+        lines = ["🧾 **ナギサが調べたよ！**"]
+        if self.title: lines.append(f"・商品名：{self.title}")
+        if self.asin: lines.append(f"・ASIN：`{self.asin}`")
+        if self.jan: lines.append(f"・JAN：`{self.jan}`")
+        if pending:
+            lines.append(f"・Amazon参考価格：{pending}")
+        else:
+            lines.append(f"・Amazon参考価格：{'—' if self.amazon_price is None else f'¥{self.amazon_price:,}'}")
+        if self.price_candidate: lines.append(f"・仕入れ値（候補）：¥{self.price_candidate:,}")
+        if self.store_chain: lines.append(f"・店舗：{self.store_chain}" + (f"（{self.store_branch}）" if self.store_branch else ""))
+        if self.dup_count > 1:
+            lines.append(f"・👥 同じ店舗・価格ですでに{self.dup_count - 1}人が報告済みだよ（{self.dup_count}人目）")
+        if self.history_stats:
+            from .keepa_history import format_lines
+            lines.extend(format_lines(self.history_stats, self.margins))
+        return "\n".join(lines)
+
+    def sheet_payload(self, job: BundleJob) -> dict:
+        return {
+            "asin": self.asin,
+            "jan": self.jan,
+            "title": self.title,
+            "amazon_price": self.amazon_price,
+            "store_chain": self.store_chain,
+            "store_branch": self.store_branch,
+            "buy_price": self.price_candidate,
+            "user": job.user,
+            "channel": job.channel_name,
+        }
+
+
+def extract_local(job: BundleJob, snap: Optional[hot_config.ConfigSnapshot] = None) -> BundleResult:
+    """正規表現だけで ID / 価格 / 店舗を抜く（ネットワークなし）"""
+    # 設定スナップショットは1回だけ取得（途中で差し替わっても同じ版で抽出する）
+    snap = snap or hot_config.current()
+    combined = "\n".join(t for t in job.texts if t)
+    ids = extract_ids(combined)
+    store_chain_from_channel = lookup_store_by_channel(job.channel_name, snap.channel_index)
+    store_chain_from_comment, store_branch = extract_store_from_comment(combined, snap.store_index)
+    return BundleResult(
+        asin=ids.get("asin"),
+        jan=ids.get("jan"),
+        price_candidate=extract_price_candidate_from_text(combined),
+        store_chain=store_chain_from_comment or store_chain_from_channel,
+        store_branch=store_branch,
+    )
+
+
+def process_bundle(job: BundleJob, keepa_key: str, fetch_keepa=None) -> Optional[BundleResult]:
+    """
+    同期版の一括処理（ワーカー用）：抽出 → Keepa。ID が無ければ None。
+    fetch_keepa を渡せば差し替え可能（既定は keepa_client.fetch_product_from_keepa）
+    """
+    if fetch_keepa is None:
+        from .keepa_client import fetch_product_from_keepa as fetch_keepa
+    from . import keepa_history
+    res = extract_local(job)
+    log.info(f"[bundle] ids: asin={res.asin} jan={res.jan} price={res.price_candidate}")
+    if not res.has_id:
+        return None
+    try:
+        res.apply_keepa(fetch_keepa(res.asin, keepa_key, res.jan, history=keepa_history.enabled()))
+    except Exception as e:
+        log.exception(f"Keepa fetch failed (bundle) for ASIN={res.asin} JAN={res.jan}: {e}")
+    return res
@@ -0,0 +1,241 @@
+# src/product_index.py
+"""
+過去の投稿商品のローカル検索インデックス。
+- 元データは append_product に渡すのと同じ dict を JSONL に追記したもの（NAGISA_INDEX_PATH）
+- ASIN / JAN は完全一致の辞書、商品名は文字2-gram の転置インデックス（日本語は分かち書き不要）
+- 追記は別プロセス（src.worker）からでも良い。検索前に refresh() でファイル末尾だけ読み足す
+- 作り直し（--rebuild-from-sheet）は新しいファイルを書いて os.replace で差し替える。
+  refresh() はファイルが入れ替わった（inode が変わった・縮んだ）のを見て、最初から読み直す
+
+初期構築（Sheets の products 全件から作り直す）:
+  python -m src.product_index --rebuild-from-sheet
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .utils import JST
+
+log = logging.getLogger(__name__)
+
+ASIN_QUERY_RE = re.compile(r"^[A-Z0-9]{10}$")
+JAN_QUERY_RE = re.compile(r"^\d{8}$|^\d{13}$")
+_FIELDS = ("asin", "jan", "title", "amazon_price", "store_chain", "store_branch", "buy_price", "user", "channel", "ts")
+
+
+def index_path() -> str:
+    return os.getenv("NAGISA_INDEX_PATH", "data/products_index.jsonl")
+
+
+def _norm(text: str) -> str:
+    """全角/半角・大小文字をそろえ、空白を除く"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", text or "").lower())
+
+
+GRAM_N = 2
+
+
+def _grams(text: str, n: int = GRAM_N) -> set:
+    t = _norm(text)
+    if len(t) < n:
+        return {t} if t else set()
+    return {t[i:i + n] for i in range(len(t) - n + 1)}
+
+
+class ProductIndex:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or index_path()
+        self.docs: List[dict] = []
+        self.by_asin: Dict[str, List[int]] = defaultdict(list)
+        self.by_jan: Dict[str, List[int]] = defaultdict(list)
+        self.grams: Dict[str, List[int]] = defaultdict(list)
+        self._offset = 0
+        self._file_id: Optional[tuple] = None  # (st_dev, st_ino)。作り直しで差し替わったら変わる
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        """読み込んだ内容を捨てる（_lock を持って呼ぶ）"""
+        self.docs = []
+        self.by_asin = defaultdict(list)
+        self.by_jan = defaultdict(list)
+        self.grams = defaultdict(list)
+        self._offset = 0
+
+    # ---- 構築 ----
+    def _add_doc(self, doc: dict):
+        i = len(self.docs)
+        self.docs.append(doc)
+        if doc.get("asin"):
+            self.by_asin[str(doc["asin"]).upper()].append(i)
+        if doc.get("jan"):
+            self.by_jan[str(doc["jan"])].append(i)
+        for g in _grams(doc.get("title") or ""):
+            self.grams[g].append(i)
+
+    def refresh(self) -> int:
+        """ファイルの続きだけ読んで取り込む（書きかけの最終行は次回に回す）。取り込んだ件数を返す"""
+        with self._lock:
+            try:
+                with open(self.path, "rb") as f:
+                    st = os.fstat(f.fileno())
+                    file_id = (st.st_dev, st.st_ino)
+                    if file_id != self._file_id or st.st_size < self._offset:
+                        if self._file_id is not None:
+                            log.info("[index] index file was replaced -> reload from start")
+                        self._reset()
+                        self._file_id = file_id
+                    f.seek(self._offset)
+                    chunk = f.read()
+            except FileNotFoundError:
+                return 0
+            end = chunk.rfind(b"\n")
+            if end < 0:
+                return 0
+            added = 0
+            for line in chunk[:end].splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    self._add_doc(json.loads(line))
+                    added += 1
+                except ValueError:
+                    log.warning("[index] skip broken line")
+            self._offset += end + 1
+            return added
+
+    def append(self, record: dict, ts: Optional[str] = None):
+        """1件を JSONL に追記（ブロッキング。to_thread から呼ぶ）"""
+        doc = {k: record.get(k) for k in _FIELDS}
+        doc["ts"] = ts or record.get("ts") or datetime.now(JST).strftime("%Y-%m-%d %H:%M:%S")
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        line = json.dumps(doc, ensure_ascii=False) + "\n"
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    # ---- 検索 ----
+    def search(self, query: str, *, store: Optional[str] = None, since: Optional[str] = None, limit: int = 10) -> List[dict]:
+        with self._lock:
+            return self._search(query, store=store, since=since, limit=limit)
+
+    def _search(self, query: str, *, store: Optional[str], since: Optional[str], limit: int) -> List[dict]:
+        q = (query or "").strip()
+        qu = q.upper()
+        if ASIN_QUERY_RE.match(qu):
+            hits = list(self.by_asin.get(qu, []))
+        elif JAN_QUERY_RE.match(q):
+            hits = list(self.by_jan.get(q, []))
+        elif len(_norm(q)) < GRAM_N:
+            # n-gram より短い語（「水」など）は転置インデックスに載らないので全件を部分一致で見る
+            nq = _norm(q)
+            if not nq:
+                return []
+            hits = [i for i, d in enumerate(self.docs) if nq in _norm(d.get("title") or "")]
+        else:
+            grams = _grams(q)
+            if not grams:
+                return []
+            # 短い posting list から順に積集合を取る
+            lists = sorted((self.grams.get(g, []) for g in grams), key=len)
+            if not lists[0]:
+                return []
+            acc = set(lists[0])
+            for pl in lists[1:]:
+                acc.intersection_update(pl)
+                if not acc:
+                    return []
+            hits = list(acc)
+            # 2-gram は並びを見ないので、最後に部分文字列で確認
+            nq = _norm(q)
+            hits = [i for i in hits if nq in _norm(self.docs[i].get("title") or "")]
+        store_n = _norm(store) if store else None
+        out = []
+        for i in sorted(hits, reverse=True):  # 新しい投稿から
+            d = self.docs[i]
+            if store_n and store_n not in _norm(d.get("store_chain") or "") and store_n not in _norm(d.get("channel") or ""):
+                continue
+            if since and (d.get("ts") or "") < since:
+                continue
+            out.append(d)
+            if len(out) >= limit:
+                break
+        return out
+
+
+def parse_query(args: str) -> dict:
+    """`!search ワード store:ヤマダ since:2026-10-01` を分解"""
+    store, since, words = None, None, []
+    for tok in (args or "").split():
+        if tok.startswith("store:"):
+            store = tok[6:]
+        elif tok.startswith("since:"):
+            since = tok[6:]
+        else:
+            words.append(tok)
+    return {"query": " ".join(words), "store": store, "since": since}
+
+
+def format_hits(hits: List[dict], query: str) -> str:
+    if not hits:
+        return f"🔍 「{query}」は見つからなかったよ…💦"
+    lines = [f"🔍 **「{query}」の過去投稿（新しい順・{len(hits)}件）**"]
+    for d in hits:
+        store = (d.get("store_chain") or d.get("channel") or "—") + (f"（{d['store_branch']}）" if d.get("store_branch") else "")
+        price = f"¥{int(d['buy_price']):,}" if str(d.get("buy_price") or "").isdigit() else "—"
+        code = d.get("asin") or d.get("jan") or "—"
+        lines.append(f"・{(d.get('ts') or '')[:10]} {store} {price} `{code}` {(d.get('title') or '')[:40]}")
+    return "\n".join(lines)
+
+
+def rebuild_from_sheet(path: Optional[str] = None) -> int:
+    """Sheets の products 全件（分割モードなら各期間シートも）から JSONL を作り直す"""
+    from .sheets_client import _worksheet, partition_mode, product_sheet_names
+    names = product_sheet_names() if partition_mode() else ["products"]
+    # シート名は products < products_2026-09 < products_2026-10 の順に並ぶので古い順になる
+    sheets = [_worksheet(n).get_all_values() for n in sorted(names)]
+    path = path or index_path()
+    tmp = f"{path}.{os.getpid()}.tmp"  # 別ファイルに書いて最後に差し替える（読み手は refresh で気づく）
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    n = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        for values in sheets:
+            if not values:
+                continue
+            header = [h.strip().lower() for h in values[0]]
+            for r in values[1:]:
+                rec = {header[i]: (r[i] if i < len(r) else "") for i in range(len(header))}
+                rec["ts"] = rec.get("timestamp") or rec.get("ts") or rec.get("日時") or ""
+                f.write(json.dumps({k: rec.get(k) or None for k in _FIELDS}, ensure_ascii=False) + "\n")
+                n += 1
+    os.replace(tmp, path)
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Nagisa product search index")
+    ap.add_argument("--rebuild-from-sheet", action="store_true")
+    ap.add_argument("--search", help="run a query against the local index")
+    args = ap.parse_args()
+    from dotenv import load_dotenv, find_dotenv
+    load_dotenv(find_dotenv(), override=True)
+    if args.rebuild_from_sheet:
+        print(f"rebuilt {rebuild_from_sheet()} records -> {index_path()}")
+    if args.search:
+        idx = ProductIndex()
+        idx.refresh()
+        q = parse_query(args.search)
+        print(format_hits(idx.search(q["query"], store=q["store"], since=q["since"]), q["query"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+# src/replay.py
+"""
+オフライン再生・負荷試験ハーネス。
+Discord / Keepa / OpenAI / Sheets をローカルの偽物に差し替え、JSONL のメッセージを
+NagisaDiscordBot.on_message → flush_bundle に指定レートで流し込んで計測する。
+
+例:
+  python -m src.replay requests.jsonl --rate 20 --inactivity 1
+  python -m src.replay --synthetic 500 --rate 50 --keepa-ms 800 --keepa-err 0.05
+
+入力 JSONL の1行（どれか1つあれば可）:
+  {"content": "...", "channel": "ヤマダ", "user": 123, "t": 0.5}
+  {"title": "...", "body": "..."}   # requests.jsonl 形式（title+body を本文として扱う）
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import string
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import discord
+
+from . import discord_bot
+from .discord_bot import NagisaDiscordBot
+from .utils import percentiles
+
+log = logging.getLogger(__name__)
+
+_ids = itertools.count(10_000)
+
+
+# ---- Discord の偽物 ----
+@dataclass
+class FakeUser:
+    id: int
+    name: str
+    bot: bool = False
+    discriminator: str = "0"
+
+    @property
+    def display_name(self) -> str:
+        return self.name
+
+    def mentioned_in(self, message) -> bool:
+        return f"<@{self.id}>" in (message.content or "")
+
+
+@dataclass
+class FakeChannel:
+    id: int
+    name: str
+
+
+@dataclass
+class FakeMessage:
+    content: str
+    author: FakeUser
+    channel: FakeChannel
+    harness: "Harness"
+    id: int = field(default_factory=lambda: next(_ids))
+    attachments: list = field(default_factory=list)
+    arrived_at: float = field(default_factory=time.perf_counter)
+
+    async def reply(self, text: str, **kwargs):
+        await self.harness.discord.call()
+        self.harness.on_reply(self, text)
+        # 返信メッセージの到着時刻は元メッセージのものを引き継ぐ（編集までの時間を測るため）
+        return FakeMessage(content=text, author=self.harness.bot_user, channel=self.channel, harness=self.harness,
+                           arrived_at=self.arrived_at)
+
+    async def edit(self, content: str = None, **kwargs):
+        await self.harness.discord.call()
+        self.content = content
+        self.harness.on_edit(self)
+
+
+# ---- バックエンドの偽物 ----
+class FakeBackend:
+    """平均レイテンシ＋ゆらぎ＋エラー率を持つ偽バックエンド。同期/非同期どちらの形でも呼べる"""
+
+    def __init__(self, name: str, latency_ms: float, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+
+    def _delay(self) -> float:
+        return max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+
+    def _maybe_fail(self):
+        self.calls += 1
+        if random.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError(f"fake {self.name} error")
+
+    def call_sync(self):
+        time.sleep(self._delay())
+        self._maybe_fail()
+
+    async def call(self):
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+
+
+class ReplayBot(NagisaDiscordBot):
+    """ゲートウェイに繋がない NagisaDiscordBot（user / get_channel だけ偽物で埋める）"""
+
+    def __init__(self, harness: "Harness", **kwargs):
+        super().__init__(**kwargs)
+        self._harness = harness
+
+    @property
+    def user(self):
+        return self._harness.bot_user
+
+    def get_channel(self, channel_id: int):
+        return self._harness.channels_by_id.get(channel_id)
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.bot_user = FakeUser(id=1, name="ナギサ", bot=True)
+        self.channels: dict = {}
+        self.channels_by_id: dict = {}
+        self.users: dict = {}
+        self.discord = FakeBackend("discord", args.discord_ms, args.discord_ms / 4, 0.0)
+        self.keepa = FakeBackend("keepa", args.keepa_ms, args.keepa_ms / 4, args.keepa_err)
+        self.openai = FakeBackend("openai", args.openai_ms, args.openai_ms / 4, args.openai_err)
+        self.sheets = FakeBackend("sheets", args.sheets_ms, args.sheets_ms / 4, args.sheets_err)
+        self.latencies: List[float] = []
+        self.enriched_latencies: List[float] = []
+        self.replies = Counter()
+        self.sent = 0
+
+    # ---- 差し替え ----
+    def install_fakes(self):
+        def fake_keepa(asin, api_key, jan=None, **kwargs):
+            self.keepa.call_sync()
+            return {"title": f"テスト商品 {asin or jan}", "amazon_price": random.randint(500, 30000), "asin": asin}
+
+        rows = itertools.count(2)
+
+        def fake_append(record):
+            self.sheets.call_sync()
+            return ("products", next(rows))
+
+        def fake_update_count(ref, count):
+            self.sheets.call_sync()
+
+        async def fake_chat(system, user, **kwargs):
+            await self.openai.call()
+            return "ナギサだよっ（リプレイ）"
+
+        async def fake_chat_messages(messages, **kwargs):
+            t0 = time.time()
+            await self.openai.call()
+            prompt = sum(len(m["content"]) for m in messages)
+            return "ナギサだよっ（リプレイ）", {
+                "prompt_tokens": prompt, "cached_tokens": len(messages[0]["content"]),
+                "completion_tokens": 10, "latency": time.time() - t0,
+            }
+
+        discord_bot.fetch_product_from_keepa = fake_keepa
+        discord_bot.append_product = fake_append
+        discord_bot.update_report_count = fake_update_count
+        discord_bot.chat_simple = fake_chat
+        discord_bot.chat_messages = fake_chat_messages
+        discord_bot.BUNDLE_INACTIVITY_SEC = self.args.inactivity
+        discord_bot.BUNDLE_MAX_WINDOW_SEC = max(self.args.inactivity * 6, self.args.inactivity + 1)
+
+    def channel(self, name: str) -> FakeChannel:
+        if name not in self.channels:
+            ch = FakeChannel(id=next(_ids), name=name)
+            self.channels[name] = ch
+            self.channels_by_id[ch.id] = ch
+        return self.channels[name]
+
+    def user(self, key) -> FakeUser:
+        if key not in self.users:
+            uid = key if isinstance(key, int) else next(_ids)
+            self.users[key] = FakeUser(id=uid, name=f"user{uid}")
+        return self.users[key]
+
+    def on_reply(self, target: FakeMessage, text: str):
+        kind = "bundle" if text.startswith("🧾") else "chat"
+        self.replies[kind] += 1
+        if kind == "bundle":
+            # 束の最後のメッセージ到着 → 返信までの体感レイテンシ
+            self.latencies.append(time.perf_counter() - target.arrived_at)
+
+    def on_edit(self, reply: FakeMessage):
+        # 2段階返信：Keepa 結果で書き換わるまでの時間
+        self.enriched_latencies.append(time.perf_counter() - reply.arrived_at)
+
+    # ---- 入力 ----
+    def load(self) -> List[dict]:
+        if self.args.synthetic:
+            return list(synthetic_records(self.args.synthetic, self.args.users))
+        recs = []
+        with open(self.args.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                r = json.loads(line)
+                content = r.get("content") or "\n".join(x for x in (r.get("title"), r.get("body")) if x)
+                recs.append({
+                    "content": content,
+                    "channel": r.get("channel") or "replay",
+                    "user": r.get("user") or r.get("request_id") or random.randrange(self.args.users),
+                    "t": r.get("t"),
+                })
+        return recs
+
+    # ---- 実行 ----
+    async def run(self) -> dict:
+        self.install_fakes()
+        recs = self.load() * self.args.repeat
+        bot = ReplayBot(self, intents=discord.Intents.default(), keepa_key="replay", channel_map={})
+
+        tracemalloc.start()
+        mem0, _ = tracemalloc.get_traced_memory()
+        t0 = time.perf_counter()
+        gap = 1.0 / self.args.rate if self.args.rate > 0 else 0.0
+        for i, r in enumerate(recs):
+            due = r["t"] if (self.args.use_timestamps and r.get("t") is not None) else i * gap
+            delay = t0 + due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            msg = FakeMessage(content=r["content"], author=self.user(r["user"]), channel=self.channel(r["channel"]), harness=self)
+            await bot.on_message(msg)
+            self.sent += 1
+        t_fed = time.perf_counter() - t0
+
+        # 束がはけて、バックグラウンド（Sheets 追記など）が終わるまで待つ
+        deadline = time.perf_counter() + self.args.inactivity * 8 + 60
+        while time.perf_counter() < deadline:
+            pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and not t.done()]
+            if not bot.bundles and not pending:
+                break
+            await asyncio.sleep(0.2)
+        elapsed = time.perf_counter() - t0
+        mem1, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            "messages": self.sent,
+            "feed_sec": round(t_fed, 2),
+            "elapsed_sec": round(elapsed, 2),
+            "bundles": self.replies["bundle"],
+            "bundles_per_sec": round(self.replies["bundle"] / elapsed, 2) if elapsed else 0.0,
+            "chat_replies": self.replies["chat"],
+            "latency_sec": {k: round(v, 3) for k, v in percentiles(self.latencies).items()},
+            "enriched_latency_sec": {k: round(v, 3) for k, v in percentiles(self.enriched_latencies).items()},
+            "calls": {b.name: {"calls": b.calls, "errors": b.errors} for b in (self.keepa, self.openai, self.sheets, self.discord)},
+            "memory_kb": {"growth": round((mem1 - mem0) / 1024, 1), "peak": round(peak / 1024, 1)},
+            "open_bundles": len(bot.bundles),
+        }
+
+
+def synthetic_records(n: int, users: int):
+    """ASIN/JAN＋価格＋店舗をときどき欠けさせた投稿と、たまのナギサ呼びを作る"""
+    stores = ["ヤマダ", "ドンキ", "ビック", "マツキヨ", "ケーズ", "サンドラッグ"]
+    # 何人もが同じ店・同じ価格で報告する「熱い」商材（全体の約3割）
+    hot = [("B0HOT" + "".join(random.choices(string.digits, k=5)), random.randint(3, 300) * 100, random.choice(stores)) for _ in range(5)]
+    for i in range(n):
+        user = random.randrange(users)
+        store = random.choice(stores)
+        if random.random() < 0.05:
+            yield {"content": "ナギサ、今日のおすすめある？", "channel": "雑談", "user": user, "t": None}
+            continue
+        if random.random() < 0.3:
+            code, price, store = random.choice(hot)
+        else:
+            if random.random() < 0.5:
+                code = "B0" + "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
+            else:
+                code = "49" + "".join(random.choices(string.digits, k=11))
+            price = random.randint(3, 300) * 100
+        parts = [code, f"{price}円", f"{store} テスト店"]
+        # 2〜3 メッセージに分けて投稿するケースも混ぜる
+        if random.random() < 0.3:
+            for p in parts:
+                yield {"content": p, "channel": store, "user": user, "t": None}
+        else:
+            yield {"content": " ".join(parts), "channel": store, "user": user, "t": None}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Nagisa bundle pipeline replay / load test")
+    ap.add_argument("path", nargs="?", help="JSONL file of messages")
+    ap.add_argument("--synthetic", type=int, default=0, help="generate N synthetic messages instead of reading a file")
+    ap.add_argument("--users", type=int, default=30)
+    ap.add_argument("--rate", type=float, default=10.0, help="messages per second (0 = as fast as possible)")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--use-timestamps", action="store_true", help="honour per-line 't' offsets instead of --rate")
+    ap.add_argument("--inactivity", type=float, default=2.0, help="override BUNDLE_INACTIVITY_SEC")
+    ap.add_argument("--keepa-ms", type=float, default=600.0)
+    ap.add_argument("--keepa-err", type=float, default=0.0)
+    ap.add_argument("--openai-ms", type=float, default=1200.0)
+    ap.add_argument("--openai-err", type=float, default=0.0)
+    ap.add_argument("--sheets-ms", type=float, default=900.0)
+    ap.add_argument("--sheets-err", type=float, default=0.0)
+    ap.add_argument("--discord-ms", type=float, default=80.0)
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+    if not args.path and not args.synthetic:
+        ap.error("path or --synthetic is required")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    logging.basicConfig(level=logging.WARNING, format="[%(asctime)s] %(levelname)s: %(message)s")
+    result = asyncio.run(Harness(args).run())
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
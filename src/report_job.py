@@ -4,10 +4,11 @@ import asyncio
 import discord
 import logging
 import os
+import time
 from typing import List
 import re
 from .openai_client import chat_complete
-from .persona import EDITOR_SYSTEM_PROMPT as SYSTEM_PROMPT
+from .persona import report_system_prompt
 
 log = logging.getLogger(__name__)
 JST = timezone(timedelta(hours=9))
@@ -125,7 +126,27 @@ def _chunk_lines(lines: List[str], max_chars: int = 9000) -> List[str]:
         chunks.append("\n".join(buf))
     return chunks
 
-async def _summarize_chunks(chunks: List[str], ydate_str: str) -> str:
+def _compress_enabled() -> bool:
+    return os.getenv("REPORT_COMPRESS", "0") == "1"
+
+def _compress(lines: List[str]) -> List[str]:
+    """ほぼ同じ行を畳む（CPU 処理なので to_thread から呼ぶ）"""
+    from .log_compress import compress_lines
+    t0 = time.perf_counter()
+    out = compress_lines(lines, threshold=float(os.getenv("REPORT_COMPRESS_THRESHOLD", "0.6")))
+    before, after = sum(len(l) for l in lines), sum(len(l) for l in out)
+    log.info(
+        f"[report] compressed {len(lines)} -> {len(out)} lines, {before} -> {after} chars "
+        f"in {(time.perf_counter()-t0)*1000:.0f}ms"
+    )
+    return out
+
+_COMPRESS_NOTE = (
+    "※行末の〔×件数 / 人数 / チャンネル〕は、ほぼ同じ内容の投稿をまとめた印です。"
+    "件数やチャンネル数が多いものは、サロン全体で広く共有された話題として扱ってください。\n"
+)
+
+async def _summarize_chunks(chunks: List[str], ydate_str: str, *, compressed: bool = False) -> str:
     # Map
     partials: List[str] = []
     for i, ck in enumerate(chunks, 1):
@@ -137,9 +158,10 @@ async def _summarize_chunks(chunks: List[str], ydate_str: str) -> str:
             "3) トレンド/仕入れに繋がる兆し\n"
             "4) キーワード（最大10件、#ハッシュタグ形式）\n"
             "※箇条書き中心で、具体名はそのまま残す。\n"
-            "---ログ---\n" + ck
+            + (_COMPRESS_NOTE if compressed else "")
+            + "---ログ---\n" + ck
         )
-        text = await chat_complete(SYSTEM_PROMPT, user, max_tokens=900, temperature=0.3)
+        text = await chat_complete(report_system_prompt(), user, max_tokens=900, temperature=0.3, route="report")
         partials.append(text)
 
     # Reduce
@@ -157,7 +179,7 @@ async def _summarize_chunks(chunks: List[str], ydate_str: str) -> str:
         "2文以内。やさしく、鼓舞するトーンで。\n"
         "――要約素材――\n" + joined
     )
-    final = await chat_complete(SYSTEM_PROMPT, final_user, max_tokens=1000, temperature=0.35)
+    final = await chat_complete(report_system_prompt(), final_user, max_tokens=1000, temperature=0.35, route="report")
     return final
 
 async def post_daily_report(bot: discord.Client):
@@ -177,11 +199,15 @@ async def post_daily_report(bot: discord.Client):
                               "・`REPORT_FALLBACK_ALL=1` を指定すると全テキストチャンネルを走査します。")
         return
 
+    compressed = _compress_enabled()
+    if compressed:
+        lines = await asyncio.to_thread(_compress, lines)
     chunks = _chunk_lines(lines)
+    log.info(f"[report] {len(lines)} lines -> {len(chunks)} chunks")
     if debug:
         sample = "\n".join(lines[:25])
         await target.send(f"🛠️ 日報デバッグ: {len(lines)}件拾えました。サンプル25件↓\n```\n{sample[:1800]}\n```")
-    text = await _summarize_chunks(chunks, label)
+    text = await _summarize_chunks(chunks, label, compressed=compressed)
 
     title = f"📰 ナギサ日報（{label}）"
     parts = [text[i:i+1900] for i in range(0, len(text), 1900)]
@@ -1,35 +1,236 @@
 import json
-import gspread
-from google.oauth2.service_account import Credentials
+import logging
+import threading
 from datetime import datetime, timezone, timedelta
 import os
 
+log = logging.getLogger(__name__)
+
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 JST = timezone(timedelta(hours=9))
 
+# 認証済みクライアント/ブックは使い回す（毎回の認証・TLS を避ける）
+_wb = None
+_ws_cache: dict = {}
+_lock = threading.Lock()
+
 def get_gspread_client():
+    # gspread / google-auth は重いので初回利用時に import
+    import gspread
+    from google.oauth2.service_account import Credentials
     path = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
     creds = Credentials.from_service_account_file(path, scopes=SCOPES)
-    return gspread.authorize(creds)
+    gc = gspread.authorize(creds)
+    # 既定は無期限。固まった呼び出しがワーカーのリースやスレッドを握り続けないように
+    gc.http_client.set_timeout(float(os.getenv("SHEETS_TIMEOUT_SEC", "20")))
+    return gc
 
 def open_sheet():
-    gc = get_gspread_client()
-    sheet_id = os.getenv("GOOGLE_SHEET_ID")
-    return gc.open_by_key(sheet_id)
+    global _wb
+    if _wb is None:
+        with _lock:
+            if _wb is None:
+                gc = get_gspread_client()
+                _wb = gc.open_by_key(os.getenv("GOOGLE_SHEET_ID"))
+    return _wb
 
 def _open():
-    creds = Credentials.from_service_account_file(
-        os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON"),
-        scopes=SCOPES
-    )
-    gc = gspread.authorize(creds)
-    return gc.open_by_key(os.getenv("GOOGLE_SHEET_ID"))
+    return open_sheet()
 
-def append_product(record: dict):
-    """products シートに1行追加"""
+def _worksheet(name: str):
+    ws = _ws_cache.get(name)
+    if ws is None:
+        ws = open_sheet().worksheet(name)
+        _ws_cache[name] = ws
+    return ws
+
+def prewarm():
+    """認証・ブック/シートのメタデータ取得を先に済ませておく"""
+    if partition_mode():
+        _partition_ws(datetime.now(JST))
+    else:
+        _worksheet("products")
+
+# ---- 期間分割モード（SHEETS_PARTITION=month|week）----
+# products を1枚で育て続けると全件読みが重くなり、いずれセル数上限にも当たるので、
+# 行は products_2026-10（月）/ products_2026-W42（週）へ書き、シートを必要時に作る。
+# products_index シートには「日付・シート名・その日の最初の行」だけを書く（1プロセス1日1回）。
+# その日の終わりは「次の日付の最初の行」で決まるので、読みは batch_get でその範囲だけ取れる。
+INDEX_SHEET = "products_index"
+PRODUCT_HEADER = [
+    "id", "asin", "jan", "title", "amazon_price", "store_chain", "store_branch",
+    "buy_price", "user", "channel", "timestamp", "report_count",
+]
+_RANGE_SLACK = 20          # 日付の境目で別プロセスの行が前後しても拾えるよう、終わりは少し余分に読む
+_index_written: set = set()
+_index_pending: dict = {}  # (日付, シート) → その日の最初の行。index へ書けるまで持っておく
+
+def partition_mode() -> "str | None":
+    mode = (os.getenv("SHEETS_PARTITION", "") or "").lower()
+    return mode if mode in ("month", "week") else None
+
+def partition_name(dt: datetime, mode: str = None) -> str:
+    mode = mode or partition_mode()
+    if mode == "week":
+        y, w, _ = dt.isocalendar()
+        return f"products_{y}-W{w:02d}"
+    return f"products_{dt.strftime('%Y-%m')}"
+
+def _get_or_create(name: str, header: list):
+    """無ければ作ってヘッダを入れる（別プロセスと同時に作ろうとしたら、相手の作ったシートを使う）"""
+    ws = _ws_cache.get(name)
+    if ws is not None:
+        return ws
+    import gspread
     wb = open_sheet()
-    ws = wb.worksheet("products")
-    ts = datetime.now(JST).strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        ws = wb.worksheet(name)
+    except gspread.WorksheetNotFound:
+        try:
+            ws = wb.add_worksheet(title=name, rows=1000, cols=len(header))
+            ws.append_row(header, value_input_option="RAW")
+        except gspread.exceptions.APIError:
+            ws = wb.worksheet(name)
+    _ws_cache[name] = ws
+    return ws
+
+def _partition_ws(dt: datetime):
+    name = partition_name(dt)
+    if name in _ws_cache:
+        return _ws_cache[name]
+    return _get_or_create(name, PRODUCT_HEADER)
+
+def _note_day(day: str, ref: "tuple | None"):
+    """その日の最初の行を index シートへ（このプロセスでは1日1回だけ）"""
+    if ref is not None and (day, ref[0]) not in _index_written:
+        # 書けなかったときに次の追記の行で書き直すと、その日の最初の行がずれる → 最初の行を覚えておく
+        _index_pending.setdefault((day, ref[0]), ref[1])
+    _flush_index_pending()
+
+def _flush_index_pending():
+    """書けていない index 行をまとめて書く。日付・シートが変わった後の追記や、読む前にも呼ぶ"""
+    for key, first in sorted(_index_pending.items()):
+        try:
+            _get_or_create(INDEX_SHEET, ["date", "sheet", "first_row"]).append_row(
+                [key[0], key[1], first], value_input_option="RAW"
+            )
+        except Exception as e:
+            # 商品行は書けているので失敗扱いにはしない（次の追記・読み出しでもう一度書く）
+            log.warning(f"[sheets] partition index write failed: {e}")
+            return
+        _index_written.add(key)
+        _index_pending.pop(key, None)
+
+def _read_index() -> list:
+    """[(date, sheet, first_row)]。同じ (date, sheet) が複数プロセスから書かれていたら小さい行を採用"""
+    _flush_index_pending()
+    values = _get_or_create(INDEX_SHEET, ["date", "sheet", "first_row"]).get_all_values()[1:]
+    best = {}
+    for r in values:
+        if len(r) < 3 or not r[2].isdigit():
+            continue
+        k = (r[0], r[1])
+        best[k] = min(best.get(k, int(r[2])), int(r[2]))
+    return sorted((d, sh, row) for (d, sh), row in best.items())
+
+def _records_for_day(day: str) -> "list | None":
+    """
+    index から day の行範囲だけ読む。index が day より後から始まっている（移行前の日）なら None。
+    day の index 行が無い（別プロセスが書けないまま終わった等）ときは、その日のシートの
+    前後の日の行範囲の間を読んで timestamp で絞る
+    """
+    import gspread
+    index = _read_index()
+    if not index or index[0][0] > day:
+        return None
+    sheets = sorted({sh for d, sh, _ in index if d == day})
+    if not sheets:
+        log.warning(f"[sheets] {day} missing from partition index -> scanning between neighbouring days")
+        sheets = [partition_name(datetime.strptime(day, "%Y-%m-%d"))]
+    out = []
+    for sheet in sheets:
+        own = [row for d2, sh2, row in index if sh2 == sheet and d2 == day]
+        prev = [row for d2, sh2, row in index if sh2 == sheet and d2 < day]
+        first = own[0] if own else (max(prev) if prev else 2)
+        # 同じシートで次に始まる日の最初の行の手前まで（最後の日なら末尾まで）
+        nxt = [row for d2, sh2, row in index if sh2 == sheet and d2 > day]
+        end = f"L{min(nxt) + _RANGE_SLACK}" if nxt else "L"
+        try:
+            header_rng, body_rng = _worksheet(sheet).batch_get(["A1:L1", f"A{first}:{end}"])
+        except gspread.WorksheetNotFound:
+            continue
+        header = header_rng[0] if header_rng else PRODUCT_HEADER
+        out.extend(_rows_on_day(header, list(body_rng), day))
+    if index[0][0] == day:
+        # 分割モードに切り替えた日は、切り替え前に products へ書かれた行もある
+        out = _legacy_records_for_day(day) + out
+    return out
+
+def _legacy_records_for_day(day: str) -> list:
+    """旧 products シートを全件読みして day の行だけ返す"""
+    import gspread
+    try:
+        values = _worksheet("products").get_all_values()  # 2次元配列で取得（型ブレ回避）
+    except gspread.WorksheetNotFound:
+        return []
+    if not values:
+        return []
+    # timestamp 列はヘッダから動的に特定（大小/全角半角を無視）。日時型でも文字列化して “含む” で判定
+    return _rows_on_day(values[0], values[1:], day)
+
+def _rows_on_day(header: list, rows: list, day: str) -> list:
+    def norm(s): return (s or "").strip().lower()
+    try:
+        ts_idx = next(i for i, h in enumerate(header) if norm(h) in ("timestamp", "time", "日時"))
+    except StopIteration:
+        return []
+    out = []
+    for r in rows:
+        rec = {header[i]: (r[i] if i < len(r) else "") for i in range(len(header))}
+        if day in str(rec.get(header[ts_idx], "")):
+            out.append(rec)
+    return out
+
+def product_sheet_names() -> list:
+    """商品行が入っているシート（旧 products ＋ 分割シート）"""
+    names = [ws.title for ws in open_sheet().worksheets()]
+    return [n for n in names if n == "products" or (n.startswith("products_") and n != INDEX_SHEET)]
+
+REPORT_COUNT_COL = 12  # L列：同じ商品・店舗・価格の報告人数（重複窓で加算）
+_report_header_ok: set = set()
+
+def _ensure_report_count_header(sheet: str):
+    """旧 products シートは L1 が空のことがあるので、最初に書く前にヘッダを入れる（1プロセス1シート1回）"""
+    if sheet in _report_header_ok:
+        return
+    ws = _worksheet(sheet)
+    current = (ws.cell(1, REPORT_COUNT_COL).value or "").strip()
+    if not current:
+        ws.update_cell(1, REPORT_COUNT_COL, PRODUCT_HEADER[REPORT_COUNT_COL - 1])
+    elif current.lower() != PRODUCT_HEADER[REPORT_COUNT_COL - 1]:
+        log.warning(f"[sheets] {sheet}!L1 is '{current}', not report_count; counts still go to column L")
+    _report_header_ok.add(sheet)
+
+def _row_ref(resp) -> "tuple | None":
+    """append_row の応答（updates.updatedRange 例: "products!A12:L12"）から (シート名, 行) を取り出す"""
+    try:
+        rng = resp["updates"]["updatedRange"]
+        sheet, cells = rng.rsplit("!", 1)
+        row = int("".join(ch for ch in cells.split(":")[0] if ch.isdigit()))
+        return sheet.strip("'"), row
+    except Exception:
+        return None
+
+def append_product(record: dict):
+    """products シート（分割モードなら今月/今週のシート）に1行追加。書き込んだ (シート名, 行番号) を返す（取れなければ None）"""
+    now = datetime.now(JST)
+    mode = partition_mode()
+    if mode:
+        ws = _partition_ws(now)  # 新しいシートは PRODUCT_HEADER（report_count 込み）で作られる
+    else:
+        ws = _worksheet("products")
+        _ensure_report_count_header("products")
+    ts = now.strftime("%Y-%m-%d %H:%M:%S")
     row = [
         "id",
         record.get("asin") or "",
@@ -42,42 +243,26 @@ def append_product(record: dict):
         record.get("user") or "",
         record.get("channel") or "",
         ts,
+        record.get("report_count") or 1,
     ]
-    ws.append_row(row, value_input_option="USER_ENTERED")
-
-def fetch_yesterday_records():
-    wb = _open()
-    ws = wb.worksheet("products")
-    values = ws.get_all_values()  # 2次元配列で取得（型ブレ回避）
-
-    if not values:
-        return []
-
-    header = values[0]
-    rows = values[1:]
+    resp = ws.append_row(row, value_input_option="USER_ENTERED")
+    ref = _row_ref(resp)
+    if mode:
+        _note_day(now.strftime("%Y-%m-%d"), ref)
+    return ref
 
-    # ヘッダから timestamp 列を動的に特定（大小/全角半角を無視）
-    def norm(s): return (s or "").strip().lower()
-    try:
-        ts_idx = next(i for i, h in enumerate(header) if norm(h) in ("timestamp", "time", "日時"))
-    except StopIteration:
-        return []
+def update_report_count(ref: tuple, count: int):
+    """append_product が返した行の報告人数を上書き"""
+    sheet, row = ref
+    _ensure_report_count_header(sheet)
+    _worksheet(sheet).update_cell(row, REPORT_COUNT_COL, count)
 
+def fetch_yesterday_records():
     # “昨日”の文字列
-    today = datetime.now(JST).date()
-    y = today - timedelta(days=1)
-    y_str = y.strftime("%Y-%m-%d")
-
-    # 行を dict に戻しつつ、timestamp は文字列化して判定
-    out = []
-    for r in rows:
-        # 行長がヘッダと違っても安全に扱う
-        rec = {header[i]: (r[i] if i < len(r) else "") for i in range(len(header))}
-        ts_val = rec.get(header[ts_idx], "")
-
-        # Google側が日時型で持っていても、文字列化で YYYY-MM-DD を含めば合格にする
-        ts_text = str(ts_val)
-        if y_str in ts_text:   # “含む” で判定（書式ゆれ吸収）
-            out.append({k: rec.get(k, "") for k in header})
-
-    return out
\ No newline at end of file
+    y_str = (datetime.now(JST).date() - timedelta(days=1)).strftime("%Y-%m-%d")
+    if partition_mode():
+        recs = _records_for_day(y_str)
+        if recs is not None:
+            return recs
+        # 分割モードに切り替える前の日 → 従来どおり products を全件読み
+    return _legacy_records_for_day(y_str)
\ No newline at end of file
@@ -0,0 +1,73 @@
+# src/startup.py
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+log = logging.getLogger(__name__)
+
+# プロセス起動からの経過を記録（main.py が最初に t0 を入れる）
+_t0: float = time.perf_counter()
+_marks: Dict[str, float] = {}
+_first_done: set = set()
+
+
+def set_origin(t0: float):
+    global _t0
+    _t0 = t0
+
+
+def mark(name: str) -> float:
+    """起動からの経過秒を name で記録してログに出す"""
+    dt = time.perf_counter() - _t0
+    _marks[name] = dt
+    log.info(f"[startup] {name} at +{dt:.2f}s")
+    return dt
+
+
+def marks() -> Dict[str, float]:
+    return dict(_marks)
+
+
+def first_reply(kind: str, took: float):
+    """種類（bundle/chat）ごとに最初の返信だけ、所要時間と起動からの経過を記録"""
+    if kind in _first_done:
+        return
+    _first_done.add(kind)
+    mark(f"first_{kind}_reply")
+    log.info(f"[startup] first {kind} reply took {took:.2f}s")
+
+
+def fast_startup_enabled() -> bool:
+    return os.getenv("NAGISA_FAST_STARTUP") == "1"
+
+
+async def _warm(name: str, fn, *args) -> Optional[float]:
+    t = time.perf_counter()
+    try:
+        await asyncio.wait_for(asyncio.to_thread(fn, *args), timeout=30)
+    except Exception as e:
+        log.warning(f"[startup] prewarm {name} failed: {e}")
+        return None
+    dt = time.perf_counter() - t
+    log.info(f"[startup] prewarm {name} done in {dt:.2f}s")
+    return dt
+
+
+async def prewarm_backends(keepa_key: str):
+    """
+    on_ready 後にバックグラウンドで Keepa / OpenAI / Sheets の import・TLS・認証を済ませる。
+    失敗してもログだけ（本番の初回呼び出しで通常どおり接続される）。
+    """
+    from . import keepa_client, openai_client, sheets_client
+
+    jobs = []
+    if keepa_key:
+        jobs.append(_warm("keepa", keepa_client.prewarm, keepa_key))
+    if os.getenv("OPENAI_API_KEY"):
+        jobs.append(_warm("openai", openai_client.prewarm))
+    if os.getenv("NAGISA_DISABLE_SHEETS") != "1" and os.getenv("GOOGLE_SHEET_ID"):
+        jobs.append(_warm("sheets", sheets_client.prewarm))
+    await asyncio.gather(*jobs)
+    mark("prewarm_done")
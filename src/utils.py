@@ -1,6 +1,20 @@
+import math
 from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterable
 
 JST = timezone(timedelta(hours=9))
 
 def now_jst() -> datetime:
     return datetime.now(tz=JST)
+
+def percentiles(values: Iterable[float], qs: Iterable[int] = (50, 95, 99)) -> Dict[str, float]:
+    """最近傍順位法でパーセンタイルを返す。空なら 0.0。例: {"p50": .., "p95": .., "p99": ..}"""
+    vals = sorted(values)
+    out = {}
+    for q in qs:
+        if not vals:
+            out[f"p{q}"] = 0.0
+            continue
+        idx = min(len(vals) - 1, max(0, math.ceil(q / 100 * len(vals)) - 1))
+        out[f"p{q}"] = vals[idx]
+    return out
@@ -0,0 +1,186 @@
+# src/work_queue.py
+"""
+ゲートウェイ（Discord 接続）とワーカー（抽出・Keepa・Sheets）をつなぐローカルの永続キュー。
+SQLite(WAL) 1ファイルで、プロセスをまたいで共有する。
+- jobs   : ゲートウェイ → ワーカー（束の処理依頼）
+- outbox : ワーカー → ゲートウェイ（Discord への返信依頼）
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    leased_at REAL,
+    leased_by TEXT,
+    error TEXT,
+    steps TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, id);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel_id INTEGER NOT NULL,
+    reply_to INTEGER,
+    edit_id INTEGER,
+    job_id INTEGER,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    sent INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_sent ON outbox(sent, id);
+"""
+
+
+def queue_path() -> str:
+    return os.getenv("NAGISA_QUEUE_PATH", "data/nagisa_queue.db")
+
+
+class WorkQueue:
+    """スレッドごとに接続を持つ薄いラッパー（呼び出しは to_thread から想定）"""
+
+    def __init__(self, path: Optional[str] = None, *, lease_sec: float = 60.0, max_attempts: int = 3):
+        self.path = path or queue_path()
+        self.lease_sec = lease_sec
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+        # 列の追加前に作られた DB 向け
+        for ddl in (
+            "ALTER TABLE outbox ADD COLUMN edit_id INTEGER",
+            "ALTER TABLE outbox ADD COLUMN job_id INTEGER",
+            "ALTER TABLE jobs ADD COLUMN steps TEXT NOT NULL DEFAULT ''",
+        ):
+            try:
+                self._conn().execute(ddl)
+            except sqlite3.OperationalError:
+                pass
+        # 同じジョブの返信は1件だけ（再実行されても outbox が二重にならない）
+        self._conn().execute("CREATE UNIQUE INDEX IF NOT EXISTS outbox_job ON outbox(job_id)")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    # ---- jobs ----
+    def push_job(self, kind: str, payload: dict) -> int:
+        cur = self._conn().execute(
+            "INSERT INTO jobs(kind, payload, created_at) VALUES (?, ?, ?)",
+            (kind, json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+        return cur.lastrowid
+
+    def lease_job(self, worker_id: str) -> Optional[Tuple[int, str, dict]]:
+        """未処理（またはリース切れ）のジョブを1件だけ原子的に確保する"""
+        c = self._conn()
+        now = time.time()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            # リース切れのまま試行回数を使い切ったもの（ワーカーが固まる/落ちる仕事）は再実行せず failed へ
+            c.execute(
+                "UPDATE jobs SET status='failed', leased_at=NULL, "
+                "error=COALESCE(error, 'lease expired after max attempts') "
+                "WHERE status='leased' AND leased_at < ? AND attempts >= ?",
+                (now - self.lease_sec, self.max_attempts),
+            )
+            row = c.execute(
+                "SELECT id, kind, payload FROM jobs "
+                "WHERE status='queued' OR (status='leased' AND leased_at < ? AND attempts < ?) "
+                "ORDER BY id LIMIT 1",
+                (now - self.lease_sec, self.max_attempts),
+            ).fetchone()
+            if row is None:
+                c.execute("COMMIT")
+                return None
+            c.execute(
+                "UPDATE jobs SET status='leased', leased_at=?, leased_by=?, attempts=attempts+1 WHERE id=?",
+                (now, worker_id, row[0]),
+            )
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return row[0], row[1], json.loads(row[2])
+
+    def renew_lease(self, job_id: int, worker_id: str) -> bool:
+        """実行中のリースを延長（ハートビート）。もう自分のリースでなければ False"""
+        cur = self._conn().execute(
+            "UPDATE jobs SET leased_at=? WHERE id=? AND status='leased' AND leased_by=?",
+            (time.time(), job_id, worker_id),
+        )
+        return cur.rowcount == 1
+
+    def mark_step(self, job_id: int, step: str):
+        """副作用（Sheets 追記など）を済ませた印。再実行時はその段を飛ばす"""
+        self._conn().execute("UPDATE jobs SET steps=steps || ? || ',' WHERE id=?", (step, job_id))
+
+    def job_steps(self, job_id: int) -> set:
+        row = self._conn().execute("SELECT steps FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return {x for x in (row[0] if row else "").split(",") if x}
+
+    def ack_job(self, job_id: int, worker_id: str) -> int:
+        """完了にする。リースが切れて別ワーカーに渡っていたら何もしない（0 を返す）"""
+        cur = self._conn().execute(
+            "UPDATE jobs SET status='done', leased_at=NULL WHERE id=? AND status='leased' AND leased_by=?",
+            (job_id, worker_id),
+        )
+        return cur.rowcount
+
+    def fail_job(self, job_id: int, worker_id: str, error: str) -> int:
+        """試行回数が残っていれば再投入、尽きたら failed。自分のリースでなければ何もしない（0 を返す）"""
+        cur = self._conn().execute(
+            "UPDATE jobs SET status=CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "leased_at=NULL, error=? WHERE id=? AND status='leased' AND leased_by=?",
+            (self.max_attempts, error[:500], job_id, worker_id),
+        )
+        return cur.rowcount
+
+    def purge_done(self, older_than_sec: float = 86400.0) -> int:
+        cur = self._conn().execute(
+            "DELETE FROM jobs WHERE status='done' AND created_at < ?", (time.time() - older_than_sec,)
+        )
+        self._conn().execute("DELETE FROM outbox WHERE sent=1 AND created_at < ?", (time.time() - older_than_sec,))
+        return cur.rowcount
+
+    def depth(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        out = {k: n for k, n in rows}
+        out["outbox"] = self._conn().execute("SELECT COUNT(*) FROM outbox WHERE sent=0").fetchone()[0]
+        return out
+
+    # ---- outbox ----
+    def push_reply(
+        self, channel_id: int, reply_to: Optional[int], content: str, *,
+        edit_id: Optional[int] = None, job_id: Optional[int] = None,
+    ) -> int:
+        """edit_id があれば新規返信ではなく、そのメッセージの編集として扱われる。
+        job_id を渡すと、同じジョブの2回目以降は何もしない（0 を返す）"""
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO outbox(channel_id, reply_to, edit_id, job_id, content, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (channel_id, reply_to, edit_id, job_id, content, time.time()),
+        )
+        return cur.lastrowid if cur.rowcount else 0
+
+    def pending_replies(self, limit: int = 20) -> List[Tuple[int, int, Optional[int], Optional[int], str]]:
+        return self._conn().execute(
+            "SELECT id, channel_id, reply_to, edit_id, content FROM outbox WHERE sent=0 ORDER BY id LIMIT ?", (limit,)
+        ).fetchall()
+
+    def mark_reply_sent(self, reply_id: int):
+        self._conn().execute("UPDATE outbox SET sent=1 WHERE id=?", (reply_id,))
@@ -0,0 +1,139 @@
+# src/worker.py
+"""
+エンリッチ用ワーカー（NAGISA_MODE=gateway のときに別プロセスで動かす）。
+キューから束を取り、抽出 → Keepa → 返信依頼（outbox）→ Sheets 追記 を行う。
+
+例:
+  python -m src.worker            # 1プロセス
+  python -m src.worker --procs 4  # 4プロセス（CPU コアに合わせて）
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv, find_dotenv
+
+from .pipeline import BundleJob, process_bundle
+from .product_index import ProductIndex
+from .work_queue import WorkQueue
+
+log = logging.getLogger(__name__)
+
+
+def _append(payload: dict):
+    if os.getenv("NAGISA_DISABLE_SHEETS") == "1":
+        log.info("[worker] sheets disabled; skip append")
+        return
+    from .sheets_client import append_product
+    t0 = time.time()
+    append_product(payload)
+    log.info(f"[worker] sheets appended in {time.time()-t0:.2f}s")
+
+
+class _Heartbeat:
+    """ジョブ実行中、リースを定期的に延長する（遅い Sheets 等でリースが切れ、別ワーカーが二重実行するのを防ぐ）"""
+
+    def __init__(self, q: WorkQueue, job_id: int, worker_id: str):
+        self.q, self.job_id, self.worker_id = q, job_id, worker_id
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{job_id}", daemon=True)
+
+    def _run(self):
+        every = max(1.0, self.q.lease_sec / 3)
+        while not self._stop.wait(every):
+            if not self.q.renew_lease(self.job_id, self.worker_id):
+                log.warning(f"[worker] lost lease on job {self.job_id}")
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def handle_bundle(q: WorkQueue, job_id: int, payload: dict, keepa_key: str, hb: Optional[_Heartbeat] = None):
+    job = BundleJob.from_dict(payload)
+    log.info(f"[worker] bundle user={job.user_id} ch={job.channel_id} lines={len(job.texts)}")
+    res = process_bundle(job, keepa_key)
+    if res is None:
+        log.info("[worker] skip: no ASIN/JAN found")
+        return
+    # 返信（最優先：Sheetsが遅くても先に返す）。job_id で一意なので再実行でも二重にならない
+    q.push_reply(job.channel_id, job.reply_to, res.reply_text(), edit_id=job.ack_id, job_id=job_id)
+    if hb is not None and hb.lost:
+        log.warning(f"[worker] job {job_id}: lease lost; leave side effects to the new owner")
+        return
+    if "sheets" in q.job_steps(job_id):
+        log.info(f"[worker] job {job_id}: sheets already appended; skip")
+        return
+    payload = res.sheet_payload(job)
+    try:
+        _append(payload)
+        q.mark_step(job_id, "sheets")
+    except Exception as e:
+        # Sheets の失敗でジョブごと再実行すると返信が二重になるので、ログのみ
+        log.exception(f"[worker] append_product failed: {e}")
+    if os.getenv("NAGISA_INDEX") == "1":
+        # ゲートウェイ側の !search は検索前にファイルの続きを読むので、ここでは追記だけ
+        ProductIndex().append(payload)
+
+
+def run_worker(worker_id: str, *, poll_sec: float = 0.3):
+    load_dotenv(find_dotenv(), override=True)
+    keepa_key = os.getenv("KEEPA_API_KEY", "")
+    q = WorkQueue(lease_sec=float(os.getenv("NAGISA_QUEUE_LEASE_SEC", "60")))
+    log.info(f"[worker] {worker_id} started queue={q.path}")
+    while True:
+        leased = q.lease_job(worker_id)
+        if leased is None:
+            time.sleep(poll_sec)
+            continue
+        job_id, kind, payload = leased
+        hb = _Heartbeat(q, job_id, worker_id)
+        try:
+            with hb:
+                if kind == "bundle":
+                    handle_bundle(q, job_id, payload, keepa_key, hb)
+                else:
+                    log.warning(f"[worker] unknown job kind={kind}")
+            # リースを失っていたら、結果の記録は新しい持ち主に任せる
+            if not hb.lost and not q.ack_job(job_id, worker_id):
+                log.warning(f"[worker] job {job_id}: lease taken over before ack")
+        except Exception as e:
+            log.exception(f"[worker] job {job_id} failed: {e}")
+            if not hb.lost and not q.fail_job(job_id, worker_id, repr(e)):
+                log.warning(f"[worker] job {job_id}: lease taken over before fail")
+
+
+def _proc_main(n: int):
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s: %(message)s")
+    run_worker(f"{socket.gethostname()}:{os.getpid()}#{n}")
+
+
+def main():
+    load_dotenv(find_dotenv(), override=True)  # --procs の既定値に .env の NAGISA_WORKER_PROCS を効かせる
+    ap = argparse.ArgumentParser(description="Nagisa enrichment worker")
+    ap.add_argument("--procs", type=int, default=int(os.getenv("NAGISA_WORKER_PROCS", "1")))
+    args = ap.parse_args()
+    if args.procs <= 1:
+        _proc_main(0)
+        return
+    procs = [multiprocessing.Process(target=_proc_main, args=(i,), daemon=True) for i in range(args.procs)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import pytest
+
+from src import extract, hot_config, persona
+from src.bundling import _strip_ids, is_complete
+
+
+@pytest.fixture(autouse=True)
+def _snapshot(monkeypatch):
+    # install() が書き換えるグローバルを monkeypatch 経由で退避し、テスト後に元へ戻す
+    monkeypatch.setattr(hot_config, "_current", hot_config._current)
+    monkeypatch.setattr(extract, "_STORE_INDEX", extract._STORE_INDEX)
+    monkeypatch.setattr(persona, "_PROMPTS", persona._PROMPTS)
+    hot_config.install(hot_config.build_snapshot({"家電": {"ヤマダ": "ヤマダ電機"}}, version=0))
+
+
+@pytest.mark.parametrize("text", [
+    "4906001234567",
+    "B0C1234567",
+    "4088820908",
+    "https://www.amazon.co.jp/dp/B0C1234567",
+    "4901234567894 ヤマダ電機",
+])
+def test_bare_id_without_price_is_not_complete(text):
+    assert not is_complete([text], "ヤマダ")
+
+
+def test_id_price_and_store_is_complete():
+    assert is_complete(["4906001234567", "1980円"], "ヤマダ")
+    assert is_complete(["B0C1234567 ¥2480"], "ヤマダ")
+
+
+def test_missing_store_is_not_complete():
+    assert not is_complete(["B0C1234567 ¥2480"], "雑談")
+
+
+def test_strip_ids_keeps_price():
+    assert "2480" in _strip_ids("B0C1234567 4906001234567 ¥2480")
+    assert "123456" not in _strip_ids("4906001234567")
@@ -0,0 +1,33 @@
+from src.digest_job import EMBED_TOTAL_LIMIT, _summary_embeds
+
+
+def _agg(n_items: int, title_len: int = 300, n_chains: int = 12) -> dict:
+    chains = [{"chain": f"チェーン{i:02d}" * 3, "count": 99, "spread_min": 12345, "spread_median": 23456} for i in range(n_chains + 3)]
+    items = [
+        {
+            "id": f"B0C{i:07d}",
+            "title": "【長いタイトル】" + "あ" * title_len,
+            "amazon_price": 123456,
+            "buy_min": 98765,
+            "posters": 12,
+            "posts": 34,
+            "chains": [c["chain"] for c in chains],
+        }
+        for i in range(n_items)
+    ]
+    return {"posts": 999, "unique_items": n_items, "posters": 88, "chains": chains, "top_items": items}
+
+
+def test_top_n_cap_fits_embed_limit():
+    footer = "一言" * 200
+    embeds = _summary_embeds(_agg(20), footer)
+    assert len(embeds) > 1
+    assert all(len(e) <= EMBED_TOTAL_LIMIT for e in embeds)
+    assert sum(len(e.fields) for e in embeds) == 20
+    assert embeds[-1].footer.text == footer
+
+
+def test_short_digest_stays_single_embed():
+    embeds = _summary_embeds(_agg(3, title_len=20), "おつかれさま")
+    assert len(embeds) == 1
+    assert len(embeds[0].fields) == 3
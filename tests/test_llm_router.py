@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src import llm_router
+
+
+def _resp():
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))], usage=None)
+
+
+@pytest.fixture(autouse=True)
+def _tracker(monkeypatch):
+    monkeypatch.setattr(llm_router, "tracker", llm_router.LatencyTracker())
+
+
+def test_fast_failure_counts_as_retry_not_hedge(monkeypatch):
+    calls = []
+
+    async def fake_create(model, messages, max_tokens, temperature, timeout):
+        calls.append(model)
+        if len(calls) == 1:
+            raise RuntimeError("502")
+        return _resp()
+
+    monkeypatch.setattr(llm_router, "_create", fake_create)
+    text, _ = asyncio.run(llm_router.routed_chat("mention", [{"role": "user", "content": "hi"}], max_tokens=10, temperature=0))
+    st = llm_router.tracker.stats()["mention"]
+    assert text == "ok" and len(calls) == 2
+    assert st["hedged"] == 0 and st["retries"] == 1
+
+
+def test_slow_primary_is_hedged(monkeypatch):
+    calls = []
+
+    async def fake_create(model, messages, max_tokens, temperature, timeout):
+        calls.append(model)
+        await asyncio.sleep(5 if len(calls) == 1 else 0)
+        return _resp()
+
+    monkeypatch.setattr(llm_router, "_create", fake_create)
+    monkeypatch.setattr(llm_router.LatencyTracker, "hedge_after", lambda self, r: 0.05)
+    asyncio.run(llm_router.routed_chat("mention", [{"role": "user", "content": "hi"}], max_tokens=10, temperature=0))
+    st = llm_router.tracker.stats()["mention"]
+    assert st["hedged"] == 1 and st["hedge_wins"] == 1 and st["retries"] == 0
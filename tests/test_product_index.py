@@ -0,0 +1,32 @@
+import json
+import os
+
+from src.product_index import ProductIndex
+
+
+def _write(path, titles):
+    with open(path, "w", encoding="utf-8") as f:
+        for t in titles:
+            f.write(json.dumps({"title": t, "asin": None}, ensure_ascii=False) + "\n")
+
+
+def test_single_char_query_falls_back_to_substring(tmp_path):
+    idx = ProductIndex(str(tmp_path / "idx.jsonl"))
+    idx.append({"title": "天然水 2L"})
+    idx.append({"title": "コーヒー豆"})
+    idx.refresh()
+    assert [d["title"] for d in idx.search("水")] == ["天然水 2L"]
+    assert [d["title"] for d in idx.search("天然水")] == ["天然水 2L"]
+
+
+def test_refresh_reloads_after_file_replaced(tmp_path):
+    path = str(tmp_path / "idx.jsonl")
+    idx = ProductIndex(path)
+    _write(path, ["古い商品A", "古い商品B", "古い商品C"])
+    assert idx.refresh() == 3
+    tmp = path + ".tmp"
+    _write(tmp, ["新しい商品"])
+    os.replace(tmp, path)
+    assert idx.refresh() == 1
+    assert [d["title"] for d in idx.docs] == ["新しい商品"]
+    assert idx.search("古い") == []
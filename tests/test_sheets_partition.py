@@ -0,0 +1,104 @@
+import pytest
+
+from src import sheets_client as sc
+
+
+class _FakeWs:
+    def __init__(self, values=None, fail=0):
+        self.values = values or []
+        self.fail = fail
+        self.appended = []
+
+    def append_row(self, row, value_input_option=None):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("quota")
+        self.appended.append(row)
+
+    def get_all_values(self):
+        return self.values
+
+    def batch_get(self, ranges):
+        first = int(ranges[1].split(":")[0][1:])
+        return [self.values[:1], self.values[first - 1:]]
+
+
+@pytest.fixture(autouse=True)
+def _reset(monkeypatch):
+    monkeypatch.setattr(sc, "_index_written", set())
+    monkeypatch.setattr(sc, "_index_pending", {})
+
+
+def test_index_retry_keeps_first_row(monkeypatch):
+    index = _FakeWs(fail=1)
+    monkeypatch.setattr(sc, "_get_or_create", lambda name, header: index)
+    sc._note_day("2026-10-18", ("products_2026-10", 5))
+    sc._note_day("2026-10-18", ("products_2026-10", 9))
+    sc._note_day("2026-10-18", ("products_2026-10", 12))
+    assert index.appended == [["2026-10-18", "products_2026-10", 5]]
+
+
+def test_switch_day_also_reads_legacy_sheet(monkeypatch):
+    header = sc.PRODUCT_HEADER
+    row = lambda title, ts: ["id", "", "", title, "", "", "", "", "", "", ts, "1"]
+    sheets = {
+        sc.INDEX_SHEET: _FakeWs([["date", "sheet", "first_row"], ["2026-10-18", "products_2026-10", "2"]]),
+        "products_2026-10": _FakeWs([header, row("new", "2026-10-18 15:00:00")]),
+        "products": _FakeWs([header, row("old", "2026-10-17 20:00:00"), row("legacy", "2026-10-18 09:00:00")]),
+    }
+    monkeypatch.setattr(sc, "_get_or_create", lambda name, h: sheets[name])
+    monkeypatch.setattr(sc, "_worksheet", lambda name: sheets[name])
+    assert [r["title"] for r in sc._records_for_day("2026-10-18")] == ["legacy", "new"]
+    assert sc._records_for_day("2026-10-17") is None
+
+
+def test_index_write_failing_on_last_append_of_day_is_retried_next_day(monkeypatch):
+    index = _FakeWs(fail=2)
+    monkeypatch.setattr(sc, "_get_or_create", lambda name, header: index)
+    sc._note_day("2026-10-18", ("products_2026-10", 5))
+    sc._note_day("2026-10-18", ("products_2026-10", 7))  # その日最後の追記でも失敗
+    assert index.appended == []
+    sc._note_day("2026-10-19", ("products_2026-10", 9))
+    assert index.appended == [["2026-10-18", "products_2026-10", 5], ["2026-10-19", "products_2026-10", 9]]
+
+
+def test_day_missing_from_index_scans_between_neighbours(monkeypatch):
+    monkeypatch.setenv("SHEETS_PARTITION", "month")
+    header = sc.PRODUCT_HEADER
+    row = lambda title, ts: ["id", "", "", title, "", "", "", "", "", "", ts, "1"]
+    sheets = {
+        sc.INDEX_SHEET: _FakeWs([
+            ["date", "sheet", "first_row"],
+            ["2026-10-17", "products_2026-10", "2"],
+            ["2026-10-19", "products_2026-10", "5"],
+        ]),
+        "products_2026-10": _FakeWs([
+            header,
+            row("d17", "2026-10-17 10:00:00"),
+            row("d18a", "2026-10-18 10:00:00"),
+            row("d18b", "2026-10-18 23:00:00"),
+            row("d19", "2026-10-19 08:00:00"),
+        ]),
+    }
+    monkeypatch.setattr(sc, "_get_or_create", lambda name, h: sheets[name])
+    monkeypatch.setattr(sc, "_worksheet", lambda name: sheets[name])
+    assert [r["title"] for r in sc._records_for_day("2026-10-18")] == ["d18a", "d18b"]
+
+
+def test_report_count_header_is_added_to_legacy_sheet(monkeypatch):
+    class _Ws:
+        def __init__(self):
+            self.cells = {}
+
+        def cell(self, r, c):
+            return type("C", (), {"value": self.cells.get((r, c))})()
+
+        def update_cell(self, r, c, v):
+            self.cells[(r, c)] = v
+
+    ws = _Ws()
+    monkeypatch.setattr(sc, "_report_header_ok", set())
+    monkeypatch.setattr(sc, "_worksheet", lambda name: ws)
+    sc.update_report_count(("products", 5), 3)
+    sc.update_report_count(("products", 6), 2)
+    assert ws.cells == {(1, 12): "report_count", (5, 12): 3, (6, 12): 2}
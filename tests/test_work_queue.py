@@ -0,0 +1,76 @@
+from src.work_queue import WorkQueue
+
+
+def test_expired_lease_is_not_retried_past_max_attempts(tmp_path):
+    q = WorkQueue(str(tmp_path / "q.db"), lease_sec=0.0, max_attempts=3)
+    job_id = q.push_job("bundle", {"x": 1})
+    # ワーカーが ack も fail もせずに消える（ハング・クラッシュ）を繰り返す
+    for _ in range(3):
+        leased = q.lease_job("w")
+        assert leased is not None and leased[0] == job_id
+    assert q.lease_job("w") is None
+    status, attempts = q._conn().execute("SELECT status, attempts FROM jobs WHERE id=?", (job_id,)).fetchone()
+    assert (status, attempts) == ("failed", 3)
+
+
+def test_failed_job_is_requeued_until_max_attempts(tmp_path):
+    q = WorkQueue(str(tmp_path / "q.db"), max_attempts=2)
+    job_id = q.push_job("bundle", {})
+    q.lease_job("w")
+    q.fail_job(job_id, "w", "boom")
+    assert q.lease_job("w")[0] == job_id
+    q.fail_job(job_id, "w", "boom")
+    assert q.lease_job("w") is None
+
+
+def test_ack_after_lost_lease_does_not_touch_new_owner(tmp_path):
+    q = WorkQueue(str(tmp_path / "q.db"), lease_sec=0.0, max_attempts=3)
+    job_id = q.push_job("bundle", {})
+    q.lease_job("w1")
+    q.lease_job("w2")  # w1 のリースが切れて w2 が取り直した
+    assert q.ack_job(job_id, "w1") == 0
+    assert q.fail_job(job_id, "w1", "late") == 0
+    assert q._conn().execute("SELECT status, leased_by FROM jobs WHERE id=?", (job_id,)).fetchone() == ("leased", "w2")
+    assert q.ack_job(job_id, "w2") == 1
+
+
+def test_outbox_insert_is_idempotent_per_job(tmp_path):
+    q = WorkQueue(str(tmp_path / "q.db"))
+    assert q.push_reply(1, 2, "a", job_id=7)
+    assert q.push_reply(1, 2, "a", job_id=7) == 0
+    q.push_reply(1, 2, "no job")
+    q.push_reply(1, 2, "no job")
+    assert len(q.pending_replies()) == 3
+
+
+def test_renew_lease_only_for_owner(tmp_path):
+    q = WorkQueue(str(tmp_path / "q.db"))
+    job_id = q.push_job("bundle", {})
+    q.lease_job("w1")
+    assert q.renew_lease(job_id, "w1")
+    assert not q.renew_lease(job_id, "w2")
+
+
+def test_rerun_skips_done_side_effects(tmp_path, monkeypatch):
+    from src import worker
+    from src.pipeline import BundleJob
+
+    class Res:
+        def reply_text(self):
+            return "reply"
+
+        def sheet_payload(self, job):
+            return {"asin": "B000000000"}
+
+    appended = []
+    monkeypatch.setattr(worker, "process_bundle", lambda job, key: Res())
+    monkeypatch.setattr(worker, "_append", appended.append)
+    monkeypatch.delenv("NAGISA_INDEX", raising=False)
+    q = WorkQueue(str(tmp_path / "q.db"))
+    job = BundleJob(texts=["B000000000"], channel_id=1, channel_name="c", user_id=2, user="u",
+                    reply_to=3, created_at=0.0)
+    job_id = q.push_job("bundle", job.to_dict())
+    for _ in range(2):  # 同じジョブが再実行されても
+        worker.handle_bundle(q, job_id, job.to_dict(), "key")
+    assert len(appended) == 1
+    assert len(q.pending_replies()) == 1